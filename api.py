@@ -0,0 +1,104 @@
+import asyncio, json, socket, threading
+from urllib.parse import urlsplit, parse_qs
+from bells import SoundType
+from scheduler import Command
+
+# a small http api on localhost, for dashboards and scripts:
+#   GET  /status             enabled, the current and the next bell of every zone
+#   GET  /schedule           today's bells of every zone
+#   POST /enable, /disable   same as the buttons in the window
+#   POST /reload             reads config.json again
+#   POST /play/<sound>       first_bell, second_bell, break or silent_minute right now, ?zone=<name> for another zone
+# the answers are prepared by the scheduler whenever its state changes, a request only copies the bytes.
+# it runs an asyncio loop in its own thread, so neither the window nor the bells wait for the clients
+
+API_PORT = 5758
+IDLE_TIMEOUT = 30   # seconds a keep-alive connection may stay silent
+MAX_HEADERS = 100
+
+class ApiServer:
+	def __init__(self, scheduler, port: int = API_PORT, host: str = "127.0.0.1") -> None:
+		self.scheduler = scheduler
+		self.scheduler.snapshots = {} # from now on the scheduler prepares them
+		self.sock = socket.create_server((host, port)) # bound here, so that a busy port is reported to the caller
+		self.loop: asyncio.AbstractEventLoop = None
+		self.server: asyncio.Server = None
+		self.thread = threading.Thread(target=asyncio.run, args=(self.serve(),), name="api", daemon=True)
+		self.thread.start()
+
+	async def serve(self) -> None:
+		self.loop = asyncio.get_running_loop()
+		self.server = await asyncio.start_server(self.handle, sock=self.sock)
+		try:
+			await self.server.serve_forever()
+		except asyncio.CancelledError: # closed
+			pass
+
+	async def handle(self, reader, writer) -> None:
+		try:
+			while True:
+				request = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+				if not request:
+					break
+				method, target, version = request.decode("latin-1").split()
+				headers = {}
+				for i in range(MAX_HEADERS):
+					line = (await reader.readline()).decode("latin-1").strip()
+					if not line:
+						break
+					name, _, value = line.partition(":")
+					headers[name.strip().lower()] = value.strip()
+				if int(headers.get("content-length", 0)):
+					await reader.readexactly(int(headers["content-length"])) # nothing takes a body, it's skipped
+				status, body = self.route(method, target)
+				keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+				writer.write(b"".join((
+					f"{version} {status}\r\n".encode(),
+					b"Content-Type: application/json; charset=utf-8\r\n",
+					f"Content-Length: {len(body)}\r\n".encode(),
+					b"Connection: keep-alive\r\n\r\n" if keep_alive else b"Connection: close\r\n\r\n",
+					body
+				)))
+				await writer.drain()
+				if not keep_alive:
+					break
+		except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+			pass # a silent, gone or broken client
+		except asyncio.CancelledError:
+			pass # the server is closing
+		writer.close()
+
+	def route(self, method: str, target: str) -> tuple:
+		url = urlsplit(target)
+		path = url.path.rstrip("/")
+		match method, path.split("/")[1:]:
+			case "GET", ["status" | "schedule"]:
+				snapshot = self.scheduler.snapshots.get(path)
+				if snapshot is None: # the first schedule isn't built yet
+					return error("503 Service Unavailable", "starting")
+				return "200 OK", snapshot
+			case "POST", ["enable"]:
+				self.scheduler.send(Command.ENABLE)
+			case "POST", ["disable"]:
+				self.scheduler.send(Command.DISABLE)
+			case "POST", ["reload"]:
+				self.scheduler.send(Command.RELOAD)
+			case "POST", ["play", sound]:
+				if sound.upper() not in SoundType.__members__:
+					return error("404 Not Found", f"unknown sound {sound}")
+				zone = parse_qs(url.query).get("zone", [None])[0]
+				if zone is not None and zone not in {known.name for known in self.scheduler.zones}: # the list is only ever replaced, never changed in place
+					return error("404 Not Found", f"unknown zone {zone}")
+				self.scheduler.send(Command.PLAY, (SoundType[sound.upper()], zone))
+			case ("GET" | "POST"), _:
+				return error("404 Not Found", f"no such path {path}")
+			case _:
+				return error("405 Method Not Allowed", f"method {method}")
+		return "202 Accepted", b'{"ok": true}' # queued for the scheduler thread
+
+	def close(self) -> None:
+		if self.loop is not None:
+			self.loop.call_soon_threadsafe(self.server.close)
+
+def error(status: str, message: str) -> tuple:
+	return status, json.dumps({"error": message}).encode()
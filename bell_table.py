@@ -0,0 +1,61 @@
+import time
+from array import array
+from bisect import bisect_left
+from bells import SoundType
+import timeline
+
+# one day of bells as parallel typed arrays instead of an object per bell. the table never changes once
+# built, so the scheduler, the window and the network thread can all read it without copying or locking
+
+class BellTable:
+	def __init__(self, minutes: array, sounds: array, fire_times: array) -> None:
+		# read only views, anyone holding the table sees exactly what the scheduler sees
+		self.minutes = memoryview(minutes).toreadonly()       # "H", minute of the day
+		self.sounds = memoryview(sounds).toreadonly()         # "b", SoundType values
+		self.fire_times = memoryview(fire_times).toreadonly() # "d", unix time, sorted
+
+	@classmethod
+	def for_day(cls, source: timeline.Timeline, today, t: time.struct_time):
+		minutes, sounds, fire_times = array("H"), array("b"), array("d")
+		for i in source.day(today):
+			minute = source.minutes[i] % timeline.DAY_MINUTES
+			minutes.append(minute)
+			sounds.append(source.sounds[i])
+			fire_times.append(time.mktime((t.tm_year, t.tm_mon, t.tm_mday, minute // 60, minute % 60, 0, 0, 0, -1)))
+		return cls(minutes, sounds, fire_times)
+
+	def __len__(self) -> int:
+		return len(self.minutes)
+
+	def sound(self, bell_n: int) -> SoundType:
+		return SoundType(self.sounds[bell_n])
+
+	def time_of_day(self, bell_n: int) -> tuple:
+		return divmod(self.minutes[bell_n], 60)
+
+	def index(self, fire_time: float) -> int:
+		# first bell at or after the given time
+		return bisect_left(self.fire_times, fire_time)
+
+class PlayedSet:
+	# played flags as generation stamps: a bell is played if its stamp is the current generation,
+	# so forgetting all of them at the day rollover is a single increment
+	def __init__(self) -> None:
+		self.stamps = array("I")
+		self.generation: int = 1
+
+	def reset(self, size: int) -> None:
+		self.generation += 1
+		if len(self.stamps) < size:
+			self.stamps.extend(array("I", [0]) * (size - len(self.stamps)))
+
+	def add(self, bell_n: int) -> None:
+		self.stamps[bell_n] = self.generation
+
+	def __contains__(self, bell_n: int) -> bool:
+		return self.stamps[bell_n] == self.generation
+
+	def flags(self, size: int) -> bytes:
+		# a copy for another thread, one byte per bell
+		generation = self.generation
+		return bytes(stamp == generation for stamp in self.stamps[:size])
@@ -0,0 +1,22 @@
+from enum import Enum
+
+class SoundType(Enum):
+	FIRST_BELL = 1
+	SECOND_BELL = 2
+	BREAK = 3
+	SILENT_MINUTE = 4
+
+BELL_NAMES = {
+	SoundType.FIRST_BELL:    "1-й дзвоник",
+	SoundType.SECOND_BELL:   "2-й дзвоник",
+	SoundType.BREAK:         "Перерва",
+	SoundType.SILENT_MINUTE: "Хвилина мовчання"
+}
+
+# a sound with a higher priority ducks the others that play at the same time
+SOUND_PRIORITIES = {
+	SoundType.FIRST_BELL:    0,
+	SoundType.SECOND_BELL:   0,
+	SoundType.BREAK:         0,
+	SoundType.SILENT_MINUTE: 1
+}
@@ -0,0 +1,219 @@
+import argparse, datetime, os, random, subprocess, sys, tempfile, threading, time
+from collections import Counter
+import scheduler, timeline, network
+from bells import SoundType
+from clock import SimulatedClock, OffsetClock
+from metrics import BellRecord
+from journal import Journal, Kind
+
+# benchmarks and a soak test for the scheduler, without a window and without sound:
+#   python bench.py               - timings
+#   python bench.py --soak 240    - replays 240 simulated days, checks that every bell rang exactly once
+#   --zones 200                   - adds that many extra zones with shifted schedules to either of them
+#   python bench.py --agents 5    - a master and 5 agents with wrong clocks on localhost, reports the fire time skew
+
+LARGE_CONFIG = scheduler.DEFAULT_CONFIG | {
+	"lessons_start": (7, 30),
+	"lesson_length": 35,
+	"num_lessons": 20,
+	"workdays": (True, True, True, True, True, True, True),
+	"holidays": [["2024-12-28", "2025-01-12"], ["2025-03-22", "2025-03-30"]] + [f"2024-11-{day:02}" for day in range(1, 31, 3)],
+	"short_days": {f"2025-02-{day:02}": 30 for day in range(1, 29)},
+	"overrides": {f"2025-04-{day:02}": [[9, minute, 3] for minute in range(0, 60, 5)] for day in range(1, 31)}
+}
+
+class FakePlayer:
+	# stands in for the player: "plays" instantly and reports the record the same way the real one does
+	def __init__(self, clock) -> None:
+		self.clock = clock
+		self.played: list[BellRecord] = []
+		self.on_started = None
+		self.on_finished = None
+		self.on_record = None
+
+	def play(self, file_name, record=None, device=None, priority=0) -> None:
+		if record is not None:
+			record.audio_start = record.audio_end = self.clock.time()
+			self.played.append(record)
+			if self.on_record is not None:
+				self.on_record(record)
+
+	def stop(self) -> None: pass
+	def set_volume(self, volume) -> None: pass
+	def preload(self, sounds) -> None: pass
+	def close(self) -> None: pass
+
+def with_zones(config, zones: int) -> dict:
+	# the same school day shifted by 0-55 minutes, so that some of the zones ring together and some don't
+	return config | {"zones": {f"zone {n}": {"lessons_start": (8, n % 12 * 5)} for n in range(zones)}}
+
+def make_scheduler(config, clock):
+	sc = scheduler.Scheduler(clock, FakePlayer(clock), Journal(None)) # in memory, so that one run doesn't see the bells of another
+	sc.parse_config(config)
+	sc.timeline_file = None
+	sc.metrics.file_name = None
+	sc.generate_bells()
+	return sc
+
+def timed(name, function, repeat) -> None:
+	function() # warm up
+	start = time.perf_counter()
+	for i in range(repeat):
+		function()
+	per_call = (time.perf_counter() - start) / repeat
+	print(f"{name:<40} {per_call * 1e6:12.1f} us")
+
+def start_of(date: datetime.date) -> float:
+	return time.mktime((date.year, date.month, date.day, 0, 0, 0, 0, 0, -1))
+
+def benchmark(zones: int) -> None:
+	clock = SimulatedClock(start_of(datetime.date(2024, 10, 1)) + 8.5 * 3600)
+	sc = make_scheduler(with_zones(LARGE_CONFIG, zones), clock)
+	print(f"{len(sc.zones)} zones, timeline: {len(sc.zones[0].timeline)} bells, {len(sc.zones[0].table)} today")
+
+	timed("build_bells (compile the year)", sc.build_bells, 20)
+	with tempfile.TemporaryDirectory() as directory:
+		sc.timeline_file = os.path.join(directory, "timeline.cache")
+		timed("build_bells (cached timeline)", sc.build_bells, 200)
+		sc.timeline_file = None
+	timed("generate_bells (nothing changed)", sc.generate_bells, 1000)
+	timed("build_bells (day rollover)", lambda: sc.build_bells(compile_timeline=False), 1000)
+	timed("update (nothing due)", sc.update, 100000)
+	journal = Journal(None)
+	timed("journal write", lambda: journal.write(Kind.FIRED, 0, SoundType.BREAK, clock.time(), clock.time()), 100000)
+	for i in range(journal.capacity): # the whole ring, spread over a year
+		fire_time = clock.time() - i * 480
+		journal.write(Kind.LATE if i % 50 == 0 else Kind.FIRED, i % 4, SoundType.BREAK, fire_time, fire_time + 0.02)
+	timed("journal query (late bells, a month)", lambda: journal.query(clock.time() - 30 * 86400, clock.time(), (Kind.LATE,)), 200)
+	import simulate
+	timed("simulate (school year)", lambda: simulate.simulate(LARGE_CONFIG, *timeline.school_year(datetime.date(2024, 10, 1))), 50)
+
+	timed("save_config", sc.save_config, 200)
+	timed("load_config", sc.load_config, 200)
+
+	stream_benchmark()
+
+	# a fresh interpreter, measured from the outside
+	code = "import scheduler; sc = scheduler.Scheduler(); sc.generate_bells(); sc.update()"
+	times = []
+	with tempfile.TemporaryDirectory() as directory:
+		for i in range(5):
+			start = time.perf_counter()
+			subprocess.run([sys.executable, "-c", code], cwd=directory, env=os.environ | {"PYTHONPATH": here}, capture_output=True)
+			times.append(time.perf_counter() - start)
+	print(f"{'cold startup (headless, best of 5)':<40} {min(times) * 1e3:12.1f} ms")
+
+def stream_benchmark() -> None:
+	# time to the first decoded block and peak memory of streaming a 5 minute sound, without a device
+	import numpy, soundfile, tracemalloc, stream
+	samples = numpy.zeros((44100 * 300, 2), dtype=numpy.float32)
+	with tempfile.TemporaryDirectory() as directory:
+		for subtype, extension in (("PCM_16", "wav"), ("PCM_16", "flac")):
+			file_name = os.path.join(directory, f"long.{extension}")
+			soundfile.write(file_name, samples, 44100, subtype=subtype)
+			tracemalloc.start()
+			start = time.perf_counter()
+			samplerate, channels, blocks = stream.open_source(file_name)
+			ring = stream.RingBuffer(stream.RING_SECONDS * samplerate, channels)
+			ring.write(next(blocks))
+			first_sample = time.perf_counter() - start
+			for block in blocks:
+				ring.read(numpy.empty_like(block)) # keep it from filling up
+				ring.write(block)
+			peak = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+			print(f"{'stream ' + extension + ' (first sample, 5 min)':<40} {first_sample * 1e6:12.1f} us, peak {peak / 1024:.0f} KiB")
+
+		# the same sound prepared on disk: transcoded once, then only memory mapped
+		import transcode
+		cache = transcode.DiskCache(os.path.join(directory, "sound_cache"))
+		start = time.perf_counter()
+		cache.prepare(file_name, 48000, 2)
+		print(f"{'prepare flac (5 min, once)':<40} {(time.perf_counter() - start) * 1e3:12.1f} ms")
+		start = time.perf_counter()
+		block = numpy.array(cache.get(file_name, 48000, 2)[:480])
+		print(f"{'prepared sound (first sample)':<40} {(time.perf_counter() - start) * 1e6:12.1f} us")
+		cache.opened.clear() # closes the memmap before the directory is removed
+	del samples
+
+def soak(days: int, zones: int) -> None:
+	first_day = datetime.date(2024, 9, 1)
+	last_day = first_day + datetime.timedelta(days=days - 1)
+	end = start_of(last_day + datetime.timedelta(days=1))
+	clock = SimulatedClock(start_of(first_day))
+	sc = make_scheduler(with_zones(LARGE_CONFIG, zones), clock)
+
+	start = time.perf_counter()
+	wakeups = 0
+	while clock.time() < end:
+		clock.advance(sc.update())
+		wakeups += 1
+	elapsed = time.perf_counter() - start
+
+	# every bell the calendar has for these days, as (zone, unix time)
+	expected = Counter()
+	for zone in sc.zones:
+		for year_start in sorted({timeline.school_year(first_day + datetime.timedelta(days=d))[0] for d in range(days)}):
+			year = timeline.compile_timeline(zone.schedule, *timeline.school_year(year_start))
+			for minute in year.minutes:
+				date = timeline.to_date(minute // timeline.DAY_MINUTES)
+				if first_day <= date <= last_day:
+					t = minute % timeline.DAY_MINUTES
+					expected[zone.zone_id, time.mktime((date.year, date.month, date.day, t // 60, t % 60, 0, 0, 0, -1))] += 1
+	fired = Counter((record.zone, record.scheduled) for record in sc.player.played)
+
+	print(f"{days} days, {sum(fired.values())} bells, {wakeups} wakeups in {elapsed:.2f} s")
+	assert fired == expected, f"missed: {len(expected - fired)}, extra: {len(fired - expected)}"
+	late = [record for record in sc.player.played if record.lateness() != 0]
+	assert not late, f"{len(late)} bells were late"
+	print("ok: every bell rang exactly once, on time")
+
+def network_test(agents: int, seconds: int = 10) -> None:
+	first = time.time() + 2
+	fire_times = [first + 0.5 * i for i in range(seconds * 2)]
+	def source(now, horizon):
+		events = [{"id": str(fire_at), "zone": "", "sound": SoundType.BREAK.value, "fire_at": fire_at} for fire_at in fire_times if now < fire_at <= now + horizon]
+		return 1, True, events
+	master = network.BellMaster(source, port=0, host="127.0.0.1")
+	port = master.sock.getsockname()[1]
+
+	nodes = []
+	for i in range(agents):
+		clock = OffsetClock(random.uniform(-30, 30))
+		agent = network.BellAgent(("127.0.0.1", port), FakePlayer(clock), lambda zone, sound: ("", None), clock)
+		threading.Thread(target=agent.run, daemon=True).start()
+		nodes.append(agent)
+	time.sleep(seconds + 3)
+	for agent in nodes:
+		agent.close()
+	master.close()
+
+	skews = master.skews()
+	print(f"{'agent':<8} {'clock':>8} {'offset error':>14} {'bells':>6} {'mean skew':>10} {'worst':>10}")
+	for i, agent in enumerate(nodes):
+		last, mean, worst = skews[f"127.0.0.1:{agent.sock_name[1]}"]
+		print(f"{i:<8} {agent.clock.offset:+7.1f}s {(agent.offset + agent.clock.offset) * 1000:+12.2f}ms {len(agent.player.played):6} {mean * 1000:8.2f}ms {worst * 1000:+8.2f}ms")
+		assert len(agent.player.played) == len(fire_times), f"agent {i} rang {len(agent.player.played)} of {len(fire_times)} bells"
+	print("ok: every agent rang every bell")
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="SBC benchmarks")
+	parser.add_argument("--soak", type=int, metavar="DAYS", help="replay this many simulated days instead of the benchmarks")
+	parser.add_argument("--zones", type=int, default=0, help="extra zones besides the main one")
+	parser.add_argument("--agents", type=int, help="run the network test with this many agents instead")
+	args = parser.parse_args()
+	here = os.path.dirname(os.path.abspath(__file__))
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory() as directory:
+		# the scheduler reads and writes its files (config.json, timeline.cache, ...) in the working directory,
+		# so the whole run happens in an empty one, never among the files of a real installation
+		os.chdir(directory)
+		try:
+			if args.agents:
+				network_test(args.agents)
+			elif args.soak:
+				soak(args.soak, args.zones)
+			else:
+				benchmark(args.zones)
+		finally:
+			os.chdir(cwd)
@@ -0,0 +1,40 @@
+import time
+
+# the scheduler only asks the clock for the current time, the conversions to and from local time
+# (time.localtime, time.mktime) don't depend on "now", so they work for a simulated clock as well
+class SystemClock:
+	def time(self) -> float:
+		return time.time()
+
+	def monotonic(self) -> float:
+		return time.monotonic()
+
+class SimulatedClock:
+	def __init__(self, start: float) -> None:
+		self.now = start
+		self.elapsed: float = 0
+
+	def time(self) -> float:
+		return self.now
+
+	def monotonic(self) -> float:
+		return self.elapsed
+
+	def advance(self, seconds: float) -> None:
+		self.now += seconds
+		self.elapsed += seconds
+
+	def jump(self, seconds: float) -> None:
+		# someone changed the system time, the monotonic clock doesn't notice
+		self.now += seconds
+
+class OffsetClock:
+	# a real clock that is wrong by a fixed offset, like an unsynchronized pc
+	def __init__(self, offset: float) -> None:
+		self.offset = offset
+
+	def time(self) -> float:
+		return time.time() + self.offset
+
+	def monotonic(self) -> float:
+		return time.monotonic()
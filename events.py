@@ -0,0 +1,48 @@
+import queue
+from enum import Enum
+from typing import NamedTuple
+
+# the scheduler runs in its own thread and never touches the window: it publishes what changed
+# on the bus, and the window sends the settings back as immutable snapshots
+
+class Event(Enum):
+	SETTINGS = 1      # Settings, what the scheduler runs with (at the start and after a reload)
+	SCHEDULE = 2      # (day, BellTable, played flags as bytes, next bell) of the main zone
+	BELL = 3          # (number of the bell of the main zone that was fired, seconds it was late)
+	ENABLED = 4       # bool, the bells were started or stopped
+	SOUND_STARTED = 5 # file name
+	SOUND_FINISHED = 6
+	METRICS = 7       # lateness summary text
+	APPLIED = 8       # None, or the error text if the settings couldn't be applied
+	SAVED = 9         # None, or the error text if config.json couldn't be written
+
+class Settings(NamedTuple):
+	# everything that can be edited in the window
+	lessons_start: tuple
+	silent_minute: tuple
+	lesson_length: int
+	break_time: int
+	first_bell: int
+	num_lessons: int
+	workdays: tuple
+	sound_files: tuple # first bell, second bell, break, silent minute
+
+class EventBus:
+	def __init__(self) -> None:
+		self.events: queue.Queue = queue.Queue()
+		self.notify = None # called from the publishing thread after every event, the ui turns it into a qt signal
+
+	def publish(self, event: Event, data=None) -> None:
+		if self.notify is None: # nobody listens (headless), don't let the queue grow
+			return
+		self.events.put((event, data))
+		self.notify()
+
+	def drain(self) -> list[tuple]:
+		# everything published so far, oldest first, without waiting
+		events = []
+		while True:
+			try:
+				events.append(self.events.get_nowait())
+			except queue.Empty:
+				return events
@@ -0,0 +1,28 @@
+import time, sys
+from scheduler import Scheduler
+
+STARTUP_BUDGET = 0.5 # seconds from the start of main.py until the first bell is armed
+
+def check_startup(started: float) -> None:
+	startup_time = time.monotonic() - started
+	if startup_time > STARTUP_BUDGET:
+		print(f"SBC: запуск зайняв {startup_time:.2f} с (бюджет {STARTUP_BUDGET:.2f} с)", file=sys.stderr)
+	if "PySide6" in sys.modules: # something pulled in qt, which is exactly what this mode is meant to avoid
+		print("SBC: Qt завантажено в режимі без вікна", file=sys.stderr)
+
+def run(started: float, master_port: int = None, api_port: int = None) -> None:
+	sc = Scheduler()
+	if api_port is not None:
+		import api
+		api_server = api.ApiServer(sc, api_port)
+	sc.generate_bells()
+	sc.update()
+	if master_port is not None:
+		import network
+		master = network.BellMaster(sc.upcoming, master_port, metrics=sc.metrics)
+	check_startup(started)
+	try:
+		sc.run() # the same loop the window runs in its scheduler thread
+	except KeyboardInterrupt:
+		pass
+	sc.player.close()
@@ -0,0 +1,127 @@
+import argparse, datetime, json, mmap, os, struct, threading, time
+from enum import Enum
+from bells import SoundType, BELL_NAMES
+from timeline import parse_date
+from zone import zone_key, MAIN_ZONE
+
+# what actually happened to every bell, kept across restarts: fixed size binary records in a memory mapped
+# ring file, so a write is a few bytes copied into the page cache and the file never grows.
+#   python journal.py --from 2024-09-01 --to 2024-10-01 --kind late   - all the late bells of september
+#   --zone <name>                                                     - of one zone only
+# the records survive a crash of the program (the kernel writes the pages out), a power loss may cost the last ones
+
+JOURNAL_FILE = "journal.bin"
+CAPACITY = 65536 # records, 2 MiB, a few years of a normal school
+LATE_MARK = 1    # seconds, a bell detected later than this is late
+MAGIC = b"SBCJ"
+JOURNAL_VERSION = 2 # 2 - zones by zone_key of the name, not by their place in the config
+
+HEADER = struct.Struct("<4sHHQ") # magic, version, record size, records written so far
+RECORD = struct.Struct("<QddHBb4x") # sequence number (0 - empty), scheduled time, time of the event, zone key, kind, sound
+HEADER_SIZE = RECORD.size # the records stay aligned
+
+class Kind(Enum):
+	SCHEDULED = 1 # in the day's schedule, written when it's built or changed
+	FIRED = 2
+	LATE = 3      # fired, but later than LATE_MARK
+	SKIPPED = 4   # not played at all: too late, the bells were disabled or the program wasn't running
+
+KIND_NAMES = {
+	Kind.SCHEDULED: "заплановано",
+	Kind.FIRED:     "пролунав",
+	Kind.LATE:      "із запізненням",
+	Kind.SKIPPED:   "пропущено"
+}
+
+class Journal:
+	def __init__(self, file_name: str = JOURNAL_FILE, capacity: int = CAPACITY) -> None:
+		# None keeps it in memory only
+		self.lock = threading.Lock() # written by the scheduler thread, may be read from any other
+		self.capacity = capacity
+		self.count: int = 0
+		size = HEADER_SIZE + capacity * RECORD.size
+		if file_name is None:
+			self.map = mmap.mmap(-1, size)
+		else:
+			with open(file_name, "r+b" if os.path.exists(file_name) else "w+b") as fp:
+				file_size = os.fstat(fp.fileno()).st_size
+				magic, version, record_size, count = HEADER.unpack(fp.read(HEADER.size).ljust(HEADER.size, b"\0"))
+				records = (file_size - HEADER_SIZE) // RECORD.size
+				if (magic, version, record_size) == (MAGIC, JOURNAL_VERSION, RECORD.size) and records > 0 and file_size == HEADER_SIZE + records * RECORD.size:
+					self.capacity, self.count = records, count # an existing one keeps its size
+				else: # new, or of another version, started over
+					fp.truncate(0)
+					fp.truncate(size)
+				self.map = mmap.mmap(fp.fileno(), 0)
+		HEADER.pack_into(self.map, 0, MAGIC, JOURNAL_VERSION, RECORD.size, self.count)
+
+	def write(self, kind: Kind, zone: int, sound: SoundType, scheduled: float, at: float) -> None:
+		with self.lock:
+			RECORD.pack_into(self.map, HEADER_SIZE + self.count % self.capacity * RECORD.size, self.count + 1, scheduled, at, zone, kind.value, sound.value)
+			self.count += 1
+			HEADER.pack_into(self.map, 0, MAGIC, JOURNAL_VERSION, RECORD.size, self.count)
+
+	def recent(self, since: float) -> list:
+		# (scheduled, at, zone, kind, sound) of the records written at or after since, the newest first.
+		# they are written as things happen, so this reads only as far back as needed, without numpy
+		records = []
+		with self.lock:
+			for seq in range(self.count, max(0, self.count - self.capacity), -1):
+				record = RECORD.unpack_from(self.map, HEADER_SIZE + (seq - 1) % self.capacity * RECORD.size)
+				if record[0] != seq or record[2] < since:
+					break
+				records.append(record[1:])
+		return records
+
+	def query(self, first: float, last: float, kinds: tuple = None, zone: int = None):
+		# the records with the scheduled time in [first, last), in the order they were written,
+		# as a numpy structured array (seq, scheduled, at, zone, kind, sound)
+		import numpy # only when someone asks, it isn't needed for the startup
+		dtype = numpy.dtype({"names": ["seq", "scheduled", "at", "zone", "kind", "sound"], "formats": ["<u8", "<f8", "<f8", "<u2", "u1", "i1"],
+			"offsets": [0, 8, 16, 24, 26, 27], "itemsize": RECORD.size})
+		with self.lock:
+			records = numpy.frombuffer(self.map, dtype=dtype, count=self.capacity, offset=HEADER_SIZE)
+			mask = (records["seq"] > 0) & (records["scheduled"] >= first) & (records["scheduled"] < last)
+			if kinds is not None:
+				mask &= numpy.isin(records["kind"], [kind.value for kind in kinds])
+			if zone is not None:
+				mask &= records["zone"] == zone
+			found = records[mask] # a copy, the map may be written over right after
+			del records
+		return found[numpy.argsort(found["seq"])]
+
+	def flush(self) -> None:
+		self.map.flush()
+
+	def close(self) -> None:
+		self.map.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="SBC - журнал дзвінків")
+	parser.add_argument("--file", default=JOURNAL_FILE)
+	parser.add_argument("--from", dest="first_day", type=parse_date, default=datetime.date.today())
+	parser.add_argument("--to", dest="last_day", type=parse_date, default=datetime.date.today())
+	parser.add_argument("--kind", choices=[kind.name.lower() for kind in Kind])
+	parser.add_argument("--zone", help="назва зони")
+	args = parser.parse_args()
+	if not os.path.exists(args.file):
+		parser.exit(1, f"Немає журналу {args.file}\n")
+
+	# the names of the zones the config has now, the journal only keeps their keys
+	names = {zone_key(MAIN_ZONE): MAIN_ZONE}
+	try:
+		with open("config.json", "r") as fp:
+			names |= {zone_key(name): name for name in json.load(fp).get("zones", {})}
+	except (OSError, ValueError, AttributeError):
+		pass
+	journal = Journal(args.file)
+	last_day = args.last_day + datetime.timedelta(days=1) # including the last day
+	records = journal.query(time.mktime(args.first_day.timetuple()), time.mktime(last_day.timetuple()),
+		(Kind[args.kind.upper()],) if args.kind else None, zone_key(args.zone) if args.zone is not None else None)
+	for record in records:
+		kind, scheduled = Kind(int(record["kind"])), float(record["scheduled"])
+		line = f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(scheduled))} зона {names.get(int(record['zone']), int(record['zone']))} {BELL_NAMES[SoundType(int(record['sound']))]} - {KIND_NAMES[kind]}"
+		if kind in (Kind.FIRED, Kind.LATE):
+			line += f" ({float(record['at']) - scheduled:+.3f} с)"
+		print(line)
+	print(f"Записів: {len(records)}")
@@ -1,13 +1,46 @@
+import time
+started = time.monotonic()
+
+import sys, argparse
+
+parser = argparse.ArgumentParser(description="SBC - програма для керування дзвінками в школах")
+parser.add_argument("--headless", action="store_true", help="без вікна, налаштування з config.json")
+parser.add_argument("--master", action="store_true", help="розсилати дзвінки агентам у мережі")
+parser.add_argument("--agent", metavar="HOST", help="дзвонити за командами головного комп'ютера HOST")
+parser.add_argument("--zone", action="append", help="(агент) дзвонити лише для цієї зони, можна кілька разів")
+parser.add_argument("--port", type=int, default=5757, help="порт для --master та --agent")
+parser.add_argument("--api", type=int, nargs="?", const=5758, metavar="PORT", help="http api на localhost (порт 5758, якщо не вказано)")
+args = parser.parse_args()
+
+if args.agent:
+	import network
+	network.run_agent(args.agent, args.port, args.zone)
+	sys.exit()
+
+if args.headless:
+	# no window at all, qt is never imported
+	import headless
+	headless.run(started, args.port if args.master else None, args.api)
+	sys.exit()
+
 from ui import Ui
 from scheduler import Scheduler
-import sys
 
 sc = Scheduler()
-ui = Ui(sc.menu_event, sc.update)
-sc.set_ui_class(ui)
+ui = Ui(sc.menu_event, sc.bus, sc.ticker)
+if args.api:
+	import api
+	api_server = api.ApiServer(sc, args.api)
+sc.start()
+
+if args.master:
+	import network
+	master = network.BellMaster(sc.upcoming, args.port, metrics=sc.metrics)
 
 ui.run()
 
 # ensure everything is closed, because the playing sound may block
 # the application exit, if no explicit close statement exists
+sc.close()
+sc.player.close()
 sys.exit()
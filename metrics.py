@@ -0,0 +1,131 @@
+import os, threading
+from collections import deque
+from dataclasses import dataclass
+from bells import SoundType
+
+METRICS_FILE = "metrics.prom" # prometheus text format, e.g. for the node_exporter textfile collector
+WINDOW = 500 # bells kept for the rolling percentiles, that's about a month of a normal school
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60) # seconds
+QUANTILES = (0.5, 0.95, 0.99)
+
+@dataclass
+class BellRecord:
+	sound: SoundType
+	scheduled: float           # unix time the bell should ring at
+	detected: float            # when the scheduler noticed it
+	audio_start: float = None  # when the sound reached the output, None if nothing was played
+	audio_end: float = None
+	zone: int = 0              # id of the zone it belongs to
+	first_sample: float = None # seconds from opening a streamed file to its first sample
+
+	def lateness(self) -> float:
+		return self.audio_start - self.scheduled
+
+class Histogram:
+	def __init__(self) -> None:
+		self.counts = [0] * (len(BUCKETS) + 1) # the last one is +Inf
+		self.sum: float = 0
+		self.count: int = 0
+		self.window: deque = deque(maxlen=WINDOW)
+
+	def add(self, value: float) -> None:
+		for i, bound in enumerate(BUCKETS):
+			if value <= bound:
+				break
+		else:
+			i = len(BUCKETS)
+		self.counts[i] += 1
+		self.sum += value
+		self.count += 1
+		self.window.append(value)
+
+	def percentile(self, q: float) -> float:
+		if not self.window:
+			return None
+		values = sorted(self.window)
+		return values[min(len(values) - 1, int(q * len(values)))]
+
+	def prometheus(self, name: str, help_text: str) -> list[str]:
+		lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+		cumulative = 0
+		for bound, count in zip(BUCKETS + ("+Inf",), self.counts):
+			cumulative += count
+			lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+		lines.append(f"{name}_sum {self.sum}")
+		lines.append(f"{name}_count {self.count}")
+		lines += [f"# HELP {name}_window Percentiles over the last {WINDOW} bells.", f"# TYPE {name}_window gauge"]
+		for q in QUANTILES:
+			value = self.percentile(q)
+			if value is not None:
+				lines.append(f'{name}_window{{quantile="{q}"}} {value}')
+		return lines
+
+class Metrics:
+	def __init__(self, file_name: str = METRICS_FILE) -> None:
+		self.file_name = file_name
+		self.lock = threading.Lock() # records come from the player thread
+		self.detection = Histogram() # scheduled -> detected by the tick
+		self.lateness = Histogram()  # scheduled -> audio start
+		self.jitter = Histogram()    # change of the lateness between two consecutive bells
+		self.first_sample = Histogram() # time to the first sample of the streamed sounds
+		self.last: BellRecord = None
+		self.last_lateness: float = None
+		self.silent: int = 0 # bells that had nothing to play
+		self.agent_skews: dict[str, float] = {} # last fire time skew of every network agent
+
+	def add(self, record: BellRecord) -> None:
+		with self.lock:
+			self.last = record
+			self.detection.add(record.detected - record.scheduled)
+			if record.first_sample is not None:
+				self.first_sample.add(record.first_sample)
+			if record.audio_start is None:
+				self.silent += 1
+				return
+			lateness = record.lateness()
+			if self.last_lateness is not None:
+				self.jitter.add(abs(lateness - self.last_lateness))
+			self.last_lateness = lateness
+			self.lateness.add(lateness)
+
+	def agent_fired(self, agent: str, skew: float) -> None:
+		with self.lock:
+			self.agent_skews[agent] = skew
+
+	def summary(self) -> str:
+		# short text for the status box
+		with self.lock:
+			if not self.lateness.count:
+				return "-"
+			p50, p95 = self.lateness.percentile(0.5), self.lateness.percentile(0.95)
+			return f"{self.last_lateness * 1000:.0f} мс (p50 {p50 * 1000:.0f}, p95 {p95 * 1000:.0f})"
+
+	def prometheus(self) -> str:
+		with self.lock:
+			lines = []
+			lines += self.lateness.prometheus("sbc_bell_lateness_seconds", "Delay from the scheduled time of a bell to the start of its sound.")
+			lines += self.detection.prometheus("sbc_bell_detection_lateness_seconds", "Delay from the scheduled time of a bell to its detection by the scheduler.")
+			lines += self.jitter.prometheus("sbc_bell_jitter_seconds", "Change of the lateness between two consecutive bells.")
+			lines += self.first_sample.prometheus("sbc_stream_first_sample_seconds", "Time from opening a streamed sound file to its first sample.")
+			lines += ["# HELP sbc_bells_silent_total Bells that had no sound to play.", "# TYPE sbc_bells_silent_total counter", f"sbc_bells_silent_total {self.silent}"]
+			if self.last is not None:
+				lines += ["# HELP sbc_last_bell_timestamp_seconds Scheduled time of the last bell.", "# TYPE sbc_last_bell_timestamp_seconds gauge", f"sbc_last_bell_timestamp_seconds {self.last.scheduled}"]
+				if self.last.audio_end is not None:
+					lines += ["# HELP sbc_last_bell_duration_seconds How long the sound of the last bell played.", "# TYPE sbc_last_bell_duration_seconds gauge", \
+						f"sbc_last_bell_duration_seconds {self.last.audio_end - self.last.audio_start}"]
+			if self.agent_skews:
+				lines += ["# HELP sbc_agent_skew_seconds Difference between the fire time of an agent and the master schedule.", "# TYPE sbc_agent_skew_seconds gauge"]
+				lines += [f'sbc_agent_skew_seconds{{agent="{agent}"}} {skew}' for agent, skew in self.agent_skews.items()]
+			return "\n".join(lines) + "\n"
+
+	def dump(self) -> None:
+		# written to a temporary file first, so that a scraper never sees half of it
+		if not self.file_name:
+			return
+		temp_name = self.file_name + ".tmp"
+		try:
+			with open(temp_name, "w") as fp:
+				fp.write(self.prometheus())
+			os.replace(temp_name, self.file_name)
+		except OSError:
+			pass
@@ -0,0 +1,117 @@
+import threading, time
+from collections import deque
+import numpy
+
+DUCK_GAIN = 0.25   # gain of the voices playing under a voice with a higher priority
+RAMP_SECONDS = 0.2 # how fast the ducking fades in and out, a sudden jump clicks
+IDLE_SECONDS = 30  # the stream is paused (but the device stays open) after this long without voices
+
+class MemorySource:
+	def __init__(self, data) -> None:
+		self.data = data # frames x channels of the mixer, at its samplerate
+		self.position: int = 0
+
+	def read(self, out) -> int:
+		count = min(len(out), len(self.data) - self.position)
+		out[:count] = self.data[self.position:self.position + count]
+		self.position += count
+		return count
+
+	def drained(self) -> bool:
+		return self.position >= len(self.data)
+
+	def cancel(self) -> None:
+		pass
+
+class Voice:
+	def __init__(self, source, gain: float = 1.0, priority: int = 0) -> None:
+		self.source = source # read(out) -> frames, drained(), cancel()
+		self.gain = gain
+		self.priority = priority
+		self.duck: float = 1.0 # current ducking gain, moves towards the target by a ramp
+		self.stopped = False
+		self.opened = time.perf_counter()
+		self.first_sample: float = None # seconds from creating the voice to its first sample in the output
+		self.started: float = None      # unix time its first sample reaches the speakers
+		self.finished = threading.Event()
+
+	def stop(self) -> None:
+		self.stopped = True
+		self.source.cancel()
+
+class Mixer:
+	# one output stream that stays open, any number of voices are summed in its callback
+	def __init__(self, sounddevice, device=None) -> None:
+		info = sounddevice.query_devices(device, "output")
+		self.samplerate = int(info["default_samplerate"])
+		self.channels = min(2, info["max_output_channels"])
+		self.volume: float = 1.0
+		self.incoming: deque = deque() # new voices, the callback picks them up, so adding never waits for it
+		self.voices: list[Voice] = []  # only touched by the callback
+		self.scratch = numpy.zeros((0, self.channels), dtype=numpy.float32)
+		self.ramp_step = 1 / (RAMP_SECONDS * self.samplerate)
+		self.idle_since: float = time.monotonic()
+		self.stream = sounddevice.OutputStream(self.samplerate, channels=self.channels, dtype="float32", device=device, callback=self.callback)
+
+	def add(self, voice: Voice) -> None:
+		self.incoming.append(voice)
+		self.idle_since = None
+		if not self.stream.active:
+			self.stream.start()
+
+	def busy(self) -> bool:
+		return bool(self.incoming or self.voices)
+
+	def pause_if_idle(self, now: float) -> None:
+		# called regularly by the player, so that a silent stream doesn't keep the cpu busy
+		if self.busy():
+			self.idle_since = None
+		elif self.idle_since is None:
+			self.idle_since = now
+		elif self.stream.active and now - self.idle_since > IDLE_SECONDS:
+			self.stream.stop()
+
+	def callback(self, outdata, frames, time_info, status) -> None:
+		while self.incoming:
+			self.voices.append(self.incoming.popleft())
+		outdata.fill(0)
+		if len(self.scratch) < frames:
+			self.scratch = numpy.zeros((frames, self.channels), dtype=numpy.float32)
+		scratch = self.scratch[:frames]
+		top = max((voice.priority for voice in self.voices if not voice.stopped), default=0)
+		latency = time_info.outputBufferDacTime - time_info.currentTime
+
+		for voice in self.voices:
+			if voice.stopped:
+				continue
+			count = voice.source.read(scratch)
+			if count:
+				if voice.started is None:
+					voice.first_sample = time.perf_counter() - voice.opened
+					voice.started = time.time() + latency
+				target = DUCK_GAIN if voice.priority < top else 1.0
+				if voice.duck == target:
+					outdata[:count] += scratch[:count] * (voice.gain * voice.duck)
+				else:
+					step = self.ramp_step if target > voice.duck else -self.ramp_step
+					ramp = numpy.clip(voice.duck + step * numpy.arange(1, count + 1, dtype=numpy.float32), DUCK_GAIN, 1.0)
+					outdata[:count] += scratch[:count] * (voice.gain * ramp)[:, None]
+					voice.duck = float(ramp[-1])
+			elif voice.source.drained():
+				voice.stopped = True # played to the end
+
+		if self.volume != 1.0:
+			outdata *= self.volume
+		for voice in self.voices:
+			if voice.stopped:
+				voice.finished.set()
+		self.voices = [voice for voice in self.voices if not voice.stopped]
+
+	def stop_all(self) -> None:
+		for voice in list(self.incoming) + self.voices:
+			voice.stop()
+
+	def close(self) -> None:
+		self.stop_all()
+		self.stream.abort()
+		self.stream.close()
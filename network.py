@@ -0,0 +1,202 @@
+import json, socket, select, threading
+from collections import deque
+from clock import SystemClock
+from bells import SoundType, SOUND_PRIORITIES
+from metrics import BellRecord
+
+# master/agent mode: the master knows the schedule and announces the upcoming bells,
+# the agents keep their clock offset to the master and ring at the same instant.
+# everything goes over udp as json datagrams:
+#   agent -> master  {"type": "sync", "t0"}                       every SYNC_INTERVAL
+#   master -> agent  {"type": "sync", "t0", "t1", "t2", "version", "enabled"}
+#   master -> agent  {"type": "bells", "version", "events": [{"id", "zone", "sound", "fire_at"}, ...]}
+#   agent -> master  {"type": "fired", "id", "fire_at", "at"}     "at" is the actual fire time in master time
+
+PORT = 5757
+SYNC_INTERVAL = 5  # seconds
+SYNC_SAMPLES = 8   # the offset is taken from the fastest of the last round trips, it's the least disturbed one
+HORIZON = 300      # seconds, how far ahead the master announces the bells
+EVENTS_PER_DATAGRAM = 200
+EARLY_MARGIN = 0.005
+LATE_LIMIT = 60
+SKEW_WINDOW = 100  # reports kept per agent
+
+def send(sock, address, message: dict) -> None:
+	try:
+		sock.sendto(json.dumps(message).encode(), address)
+	except OSError:
+		pass # the other side will ask again
+
+class AgentStats:
+	def __init__(self) -> None:
+		self.last_seen: float = None
+		self.skews: deque = deque(maxlen=SKEW_WINDOW)
+
+	def summary(self) -> tuple:
+		# last, mean absolute and worst skew in seconds
+		if not self.skews:
+			return None, None, None
+		return self.skews[-1], sum(abs(skew) for skew in self.skews) / len(self.skews), max(self.skews, key=abs)
+
+class BellMaster:
+	def __init__(self, source, port: int = PORT, host: str = "", clock=None, metrics=None) -> None:
+		self.source = source # source(now, horizon) -> (version, enabled, events)
+		self.clock = clock if clock is not None else SystemClock()
+		self.metrics = metrics
+		self.agents: dict[str, AgentStats] = {}
+		self.lock = threading.Lock()
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind((host, port))
+		self.thread = threading.Thread(target=self.serve, name="master", daemon=True)
+		self.thread.start()
+
+	def serve(self) -> None:
+		while True:
+			try:
+				data, address = self.sock.recvfrom(65535)
+			except OSError: # closed
+				return
+			received = self.clock.time()
+			try:
+				message = json.loads(data)
+			except ValueError:
+				continue
+			agent = f"{address[0]}:{address[1]}"
+			with self.lock:
+				stats = self.agents.setdefault(agent, AgentStats())
+				stats.last_seen = received
+			try:
+				self.handle(message, address, agent, stats, received)
+			except (KeyError, TypeError, AttributeError): # anyone on the network can send anything, one bad datagram is just dropped
+				continue
+
+	def handle(self, message: dict, address: tuple, agent: str, stats: AgentStats, received: float) -> None:
+		match message.get("type"):
+			case "sync":
+				t0 = message["t0"]
+				version, enabled, events = self.source(received, HORIZON)
+				send(self.sock, address, {"type": "sync", "t0": t0, "t1": received, "t2": self.clock.time(), "version": version, "enabled": enabled})
+				for i in range(0, len(events), EVENTS_PER_DATAGRAM):
+					send(self.sock, address, {"type": "bells", "version": version, "events": events[i:i + EVENTS_PER_DATAGRAM]})
+			case "fired":
+				skew = float(message["at"] - message["fire_at"])
+				with self.lock:
+					stats.skews.append(skew)
+				if self.metrics is not None:
+					self.metrics.agent_fired(agent, skew)
+					self.metrics.dump()
+
+	def skews(self) -> dict:
+		with self.lock:
+			return {agent: stats.summary() for agent, stats in self.agents.items()}
+
+	def close(self) -> None:
+		self.sock.close()
+
+class BellAgent:
+	def __init__(self, master: tuple, player, resolve, clock=None, zones=None) -> None:
+		self.master = master
+		self.master_address: tuple = None # resolved, only the datagrams from it are accepted
+		self.player = player
+		self.resolve = resolve # resolve(zone name, SoundType) -> (file name, output device)
+		self.clock = clock if clock is not None else SystemClock()
+		self.zones = zones     # names of the zones this agent rings, all of them if None
+		self.samples: deque = deque(maxlen=SYNC_SAMPLES) # (round trip, offset)
+		self.offset: float = None # master time - local time
+		self.version = None
+		self.pending: dict[str, dict] = {} # announced, not fired yet
+		self.fired: dict[str, float] = {}  # id -> fire time, so that a repeated announcement doesn't ring twice
+		self.running = True
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.sock.bind(("", 0))
+		self.sock_name = self.sock.getsockname()
+
+	def run(self) -> None:
+		next_sync = 0
+		while self.running:
+			now = self.clock.time()
+			if now >= next_sync:
+				if self.master_address is None:
+					try:
+						self.master_address = (socket.gethostbyname(self.master[0]), self.master[1])
+					except OSError:
+						pass # no network or dns yet, tried again at the next sync
+				if self.master_address is not None:
+					send(self.sock, self.master_address, {"type": "sync", "t0": now})
+				next_sync = now + SYNC_INTERVAL
+			self.fire_due(now)
+
+			wakeup = next_sync
+			if self.pending and self.offset is not None:
+				wakeup = min(wakeup, min(event["fire_at"] for event in self.pending.values()) - self.offset)
+			try:
+				readable, _, _ = select.select([self.sock], [], [], max(0, wakeup - self.clock.time()))
+				if readable:
+					self.receive(*self.sock.recvfrom(65535))
+			except (OSError, ValueError, KeyError, TypeError, AttributeError): # closed or a broken message
+				if not self.running:
+					return
+
+	def receive(self, data, address) -> None:
+		if address != self.master_address: # otherwise anyone on the network could ring the bells
+			return
+		message = json.loads(data)
+		match message.get("type"):
+			case "sync":
+				t3 = self.clock.time()
+				t0, t1, t2 = message["t0"], message["t1"], message["t2"]
+				self.samples.append(((t3 - t0) - (t2 - t1), ((t1 - t0) + (t2 - t3)) / 2))
+				self.offset = min(self.samples)[1]
+				if message["version"] != self.version or not message["enabled"]:
+					self.pending.clear() # the schedule was rebuilt, or the bells were stopped
+				self.version = message["version"]
+			case "bells":
+				if message["version"] != self.version:
+					return
+				sounds = set()
+				for event in message["events"]:
+					if event["id"] not in self.fired and (self.zones is None or event["zone"] in self.zones):
+						self.pending[event["id"]] = event
+						sounds.add(self.resolve(event["zone"], SoundType(event["sound"])))
+				self.player.preload(sounds)
+
+	def fire_due(self, now: float) -> None:
+		if self.offset is None:
+			return
+		master_now = now + self.offset
+		for event_id, event in list(self.pending.items()):
+			if event["fire_at"] > master_now + EARLY_MARGIN:
+				continue
+			del self.pending[event_id]
+			self.fired[event_id] = event["fire_at"]
+			if master_now - event["fire_at"] > LATE_LIMIT:
+				continue
+			sound = SoundType(event["sound"])
+			file_name, device = self.resolve(event["zone"], sound)
+			self.player.play(file_name, BellRecord(sound, event["fire_at"] - self.offset, now), device, SOUND_PRIORITIES[sound])
+			send(self.sock, self.master_address, {"type": "fired", "id": event_id, "fire_at": event["fire_at"], "at": master_now})
+		for event_id, fire_at in list(self.fired.items()):
+			if master_now - fire_at > 2 * HORIZON:
+				del self.fired[event_id]
+
+	def close(self) -> None:
+		self.running = False
+		self.sock.close()
+
+def run_agent(master_host: str, port: int = PORT, zones=None) -> None:
+	from scheduler import Scheduler
+	from journal import Journal
+	# only for the sound files and the player, the timing comes from the master. its journal is kept in
+	# memory: the bells are rung by the agent, so a journal of this scheduler would never see them
+	sc = Scheduler(journal=Journal(None))
+	sc.generate_bells()
+	def resolve(zone_name, sound):
+		zone = next((zone for zone in sc.zones if zone.name == zone_name), sc.zones[0])
+		return zone.sound_file(sound), zone.output
+	agent = BellAgent((master_host, port), sc.player, resolve, zones=zones)
+	try:
+		agent.run()
+	except KeyboardInterrupt:
+		pass
+	agent.close()
+	sc.player.close()
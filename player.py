@@ -0,0 +1,177 @@
+import threading, queue, time, sys, traceback
+from enum import Enum
+
+class Command(Enum):
+	PLAY = 1
+	STOP = 2
+	VOLUME = 3
+	PRELOAD = 4
+	QUIT = 5
+
+POLL_INTERVAL = 0.05 # how often the worker checks for finished sounds while something is playing
+
+def log_error(message: str) -> None:
+	print(f"SBC: {message}", file=sys.stderr)
+	traceback.print_exc()
+
+class Player:
+	def __init__(self) -> None:
+		self.commands: queue.Queue = queue.Queue()
+		self.volume: float = 1.0
+		self.now_playing: str = None # the last sound that was started and is still playing
+		self.cache = None # created by the worker, only ever touched from its thread
+		self.mixers: dict = {} # output device -> Mixer, opened once and kept open
+		self.playing: list[tuple] = [] # (voice, file name, record, streamed) started and not reported as finished yet
+
+		# callbacks, called from the worker thread (the ui wraps them into qt signals)
+		self.on_started = None
+		self.on_finished = None
+		self.on_record = None # gets the timing record of a bell once it's done with it
+
+		self.thread = threading.Thread(target=self.worker, name="player", daemon=True)
+		self.thread.start()
+
+	# all of the public methods only push a command, so they never block the caller
+	def play(self, file_name: str, record=None, device=None, priority: int = 0) -> None:
+		self.commands.put((Command.PLAY, (file_name, record, device, priority)))
+
+	def stop(self) -> None:
+		self.commands.put((Command.STOP, None))
+
+	def set_volume(self, volume: float) -> None:
+		self.commands.put((Command.VOLUME, volume))
+
+	def preload(self, sounds) -> None:
+		# (file name, output device) pairs, decoded and the devices opened now, not at the moment of the bell
+		self.commands.put((Command.PRELOAD, tuple(sounds)))
+
+	def close(self) -> None:
+		self.commands.put((Command.QUIT, None))
+		self.thread.join(1)
+
+	def worker(self) -> None:
+		# imported here, so that loading the audio libraries doesn't slow down the startup
+		import sounddevice
+		from sound_cache import SoundCache
+		self.sounddevice = sounddevice
+		self.cache = SoundCache()
+		while True:
+			busy = self.playing or any(mixer.stream.active for mixer in self.mixers.values())
+			try:
+				command, arg = self.commands.get(timeout=POLL_INTERVAL if busy else None)
+			except queue.Empty:
+				command, arg = None, None
+			# this thread plays every bell, so whatever goes wrong with one command is reported and the loop goes on
+			try:
+				if self.handle_command(command, arg):
+					return
+			except Exception:
+				log_error(f"не вдалося виконати {command.name}")
+			try:
+				self.reap()
+				now = time.monotonic()
+				for device, mixer in list(self.mixers.items()):
+					try:
+						mixer.pause_if_idle(now)
+					except self.sounddevice.PortAudioError:
+						log_error("пристрій виводу недоступний")
+						self.drop_mixer(device)
+			except Exception:
+				log_error("помилка програвача")
+
+	def handle_command(self, command: Command, arg) -> bool:
+		# True when the worker has to end
+		match command:
+			case Command.PLAY:
+				self.start_voice(*arg)
+			case Command.STOP:
+				for mixer in self.mixers.values():
+					mixer.stop_all()
+			case Command.VOLUME:
+				self.volume = arg
+				for mixer in self.mixers.values():
+					mixer.volume = arg
+			case Command.PRELOAD:
+				for file_name, device in arg:
+					mixer = self.get_mixer(device)
+					if file_name and mixer is not None:
+						self.cache.preload(file_name, mixer.samplerate, mixer.channels)
+			case Command.QUIT:
+				for device in list(self.mixers):
+					self.drop_mixer(device)
+				return True
+		return False
+
+	def get_mixer(self, device):
+		from mixer import Mixer
+		if device not in self.mixers:
+			try:
+				self.mixers[device] = Mixer(self.sounddevice, device)
+				self.mixers[device].volume = self.volume
+			except (ValueError, self.sounddevice.PortAudioError): # no such device
+				return None
+		return self.mixers[device]
+
+	def drop_mixer(self, device) -> None:
+		# the device is gone (say, an unplugged usb card): its voices are finished as they are,
+		# and the next bell for it opens the device again
+		mixer = self.mixers.pop(device)
+		for voice in list(mixer.incoming) + mixer.voices:
+			voice.stop()
+			voice.finished.set()
+		try:
+			mixer.close()
+		except self.sounddevice.PortAudioError:
+			pass
+
+	def start_voice(self, file_name, record, device, priority) -> None:
+		from mixer import Voice, MemorySource
+		from stream import StreamSource
+		mixer = self.get_mixer(device)
+		if not file_name or mixer is None: # no sound file selected for this bell
+			self.report(record)
+			return
+		try:
+			data = self.cache.get(file_name, mixer.samplerate, mixer.channels)
+			source = MemorySource(data) if data is not None else StreamSource(file_name, mixer.samplerate, mixer.channels)
+		except (RuntimeError, OSError):
+			self.report(record)
+			return
+		voice = Voice(source, priority=priority)
+		try:
+			mixer.add(voice)
+		except self.sounddevice.PortAudioError:
+			log_error("пристрій виводу недоступний")
+			self.drop_mixer(device)
+			self.report(record) # counted as a bell that had nothing to play
+			return
+		self.playing.append((voice, file_name, record, data is None))
+		self.now_playing = file_name
+		self.notify(self.on_started, file_name)
+
+	def reap(self) -> None:
+		# reports the sounds that have ended since the last time
+		still_playing = []
+		for playing in self.playing:
+			voice, file_name, record, streamed = playing
+			if not voice.finished.is_set():
+				still_playing.append(playing)
+				continue
+			if record is not None:
+				record.audio_start = voice.started
+				record.audio_end = time.time()
+				if streamed:
+					record.first_sample = voice.first_sample
+			if self.now_playing == file_name:
+				self.now_playing = None
+			self.notify(self.on_finished, file_name)
+			self.report(record)
+		self.playing = still_playing
+
+	def report(self, record) -> None:
+		if record is not None and self.on_record is not None:
+			self.on_record(record)
+
+	def notify(self, callback, file_name) -> None:
+		if callback is not None:
+			callback(file_name)
@@ -1,22 +1,28 @@
-import time, json
-from dataclasses import dataclass
+import time, json, heapq, datetime, os, threading, queue
 from enum import Enum
-from playsound import playsound
-
-class SoundType(Enum):
-	FIRST_BELL = 1
-	SECOND_BELL = 2
-	BREAK = 3
-	SILENT_MINUTE = 4
-
-BELL_NAMES = {
-	SoundType.FIRST_BELL:    "1-й дзвоник",
-	SoundType.SECOND_BELL:   "2-й дзвоник",
-	SoundType.BREAK:         "Перерва",
-	SoundType.SILENT_MINUTE: "Хвилина мовчання"
-}
+from bells import SOUND_PRIORITIES
+from player import Player, log_error
+from metrics import Metrics, BellRecord
+from clock import SystemClock
+from zone import Zone, MAIN_ZONE
+from events import Event, EventBus, Settings
+from watcher import FileWatcher, file_stat
+from ticker import Ticker
+from journal import Journal, Kind, LATE_MARK
+import timeline
+
+CONFIG_VERSION = 3
+CONFIG_FILE = "config.json"
+
+MAX_SLEEP = 60     # seconds, so that a changed system clock is noticed in time
+CLOCK_JUMP = 2     # seconds of disagreement between the wall and monotonic clocks, that count as a clock change
+EARLY_MARGIN = 0.005 # timers may wake up a bit too early, that's close enough
+LATE_LIMIT = 60    # seconds, a bell that is late by more than this is skipped (same as the old "matching minute")
+ERROR_DELAY = 1    # seconds before trying again after update() failed
 
-CONFIG_VERSION = 0
+SCHEDULE_FIELDS = ("lessons_start", "silent_minute", "lesson_length", "break_time", "first_bell", "num_lessons", "workdays", "term", "holidays", "short_days", "overrides")
+CONFIG_FIELDS = SCHEDULE_FIELDS + ("bell_sound_files", "volume", "output", "zone_configs") # everything parse_config sets
+CONFIG_ERRORS = (OSError, ValueError, KeyError, IndexError, TypeError, AttributeError) # what a broken config.json may raise
 
 DEFAULT_CONFIG = {
 	"version": CONFIG_VERSION,
@@ -27,25 +33,50 @@ DEFAULT_CONFIG = {
 	"first_bell": 1,
 	"num_lessons": 8,
 	"workdays": (True, True, True, True, True, True, False),
+	"volume": 1.0,
+	"term": None,      # ["YYYY-MM-DD", "YYYY-MM-DD"], the current school year if not set
+	"holidays": [],    # "YYYY-MM-DD" or ["YYYY-MM-DD", "YYYY-MM-DD"] (inclusive)
+	"short_days": {},  # "YYYY-MM-DD": lesson length
+	"overrides": {},   # "YYYY-MM-DD": [[hour, minute, sound type], ...], replaces the whole day
+	"output": None,    # sounddevice output device, the default one if not set
 	"sound_files": {
 		"first_bell": "",
 		"second_bell": "",
 		"break": "",
 		"silent_minute": ""
-	}
+	},
+	"zones": {}        # "name": {any of the schedule fields, "sound_files", "output"}, the rest is taken from above
 }
 
-@dataclass
-class Bell:
-	sound: SoundType
-	hour: int
-	minute: int
-	played: bool = False
+class Command(Enum):
+	APPLY = 1
+	SAVE = 2
+	ENABLE = 3
+	DISABLE = 4
+	RELOAD = 5 # config.json again, arg is False if only when it differs from what was last loaded or saved
+	PLAY = 6   # (SoundType, zone name or None for the main zone), right now
+	QUIT = 7
 
 class Scheduler:
-	def __init__(self) -> None:
-		self.bells: list[Bell] = []
+	def __init__(self, clock=None, player=None, journal=None) -> None:
+		self.clock = clock if clock is not None else SystemClock()
+		self.zones: list[Zone] = []
+		self.events: list[tuple] = [] # heap of (fire time, zone id) of the next bell of every zone
+		self.schedule_version: int = 0 # changes every time the bells are rebuilt
+		self.lock = threading.Lock()   # the network master reads the zones from its own thread
+		self.day: tuple = None
+		self.day_span: tuple = (0, 0) # unix times of today's and tomorrow's midnight
+		self.clock_offset: float = self.clock.time() - self.clock.monotonic()
 		self.bells_enabled: bool = True
+		self.bus = EventBus() # what changed, for the window (which is optional, without it the settings come only from config.json)
+		self.commands: queue.Queue = queue.Queue() # from the window, handled by the scheduler thread between the bells
+		self.thread: threading.Thread = None
+		self.snapshots: dict = None # path -> json bytes of the state for the local api, None if it isn't running
+		self.config_stat: tuple = None # of config.json as it was last loaded or saved, so that our own saves aren't reloaded
+		self.watcher: FileWatcher = None
+		self.ticker = Ticker(self.clock) # everything periodic except the bells themselves
+		self.journal = journal if journal is not None else Journal()
+		self.skipped: set = set() # (zone key, fire time) of today's bells already journaled as skipped
 		self.CONFIG_VERSION: int = CONFIG_VERSION # bypass for match-case statement insensitivity to non-class variables
 		
 		self.lessons_start: tuple = (None, None)
@@ -56,75 +87,389 @@ class Scheduler:
 		self.num_lessons: int = None
 		self.workdays: list = None
 		self.bell_sound_files: tuple = None
+		self.volume: float = None
+		self.term: list = None
+		self.holidays: list = None
+		self.short_days: dict = None
+		self.overrides: dict = None
+		self.output: str = None
+		self.zone_configs: dict = None
+		self.timeline_file: str = timeline.CACHE_FILE
 		self.load_config()
 
-	def set_ui_class(self, ui_class) -> None:
-		self.ui = ui_class
-		self.ui.set_settings(self.lessons_start, self.silent_minute, self.lesson_length, self.break_time, self.first_bell, self.num_lessons, self.workdays, self.bell_sound_files)
+		self.metrics = Metrics()
+		self.player = player if player is not None else Player()
+		self.player.on_record = self.bell_recorded
+		self.player.on_started = lambda file_name: self.bus.publish(Event.SOUND_STARTED, file_name)
+		self.player.on_finished = lambda file_name: self.bus.publish(Event.SOUND_FINISHED, file_name)
+		self.player.set_volume(self.volume)
+
+	def start(self) -> None:
+		# the first schedule is built right away, then the bells are timed by a thread of their own,
+		# so nothing the window does (a modal message box, a slow repaint) can delay them
+		self.bus.publish(Event.SETTINGS, self.settings())
+		self.bus.publish(Event.ENABLED, self.bells_enabled)
 		self.generate_bells()
+		self.thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+		self.thread.start()
+
+	def run(self) -> None:
+		# sleeps until the next bell or until a command comes. this is the only thread that rings the bells,
+		# so whatever goes wrong in one update or one command is reported and the loop goes on
+		self.watcher = FileWatcher(CONFIG_FILE, lambda: self.send(Command.RELOAD, False), self.ticker)
+		while True:
+			try:
+				delay = self.update()
+			except Exception:
+				log_error("помилка планувальника")
+				delay = ERROR_DELAY
+			try:
+				command, arg = self.commands.get(timeout=delay)
+			except queue.Empty:
+				continue
+			try:
+				if self.handle_command(command, arg):
+					return
+			except Exception as error:
+				log_error(f"не вдалося виконати {command.name}")
+				match command:
+					case Command.APPLY: self.bus.publish(Event.APPLIED, str(error))
+					case Command.SAVE:  self.bus.publish(Event.SAVED, str(error))
 
-	def apply_config(self):
-		self.lessons_start, self.silent_minute, self.lesson_length, self.break_time, self.first_bell, self.num_lessons, self.workdays, self.bell_sound_files = self.ui.get_settings()
+	def handle_command(self, command: Command, arg) -> bool:
+		# True when the loop has to end
+		match command:
+			case Command.APPLY:
+				old_config = self.config_fields()
+				self.apply_settings(arg)
+				try:
+					self.generate_bells()
+				except CONFIG_ERRORS:
+					self.restore_config_fields(old_config) # the bells go on as they were
+					raise
+				self.bus.publish(Event.APPLIED, None)
+			case Command.SAVE:
+				self.save_config(arg)
+				self.bus.publish(Event.SAVED, None)
+				self.player.preload({(file_name, self.output) for file_name in arg.sound_files}) # prepared before they are even applied
+			case Command.ENABLE:
+				self.bells_enabled = True
+				self.bus.publish(Event.ENABLED, True)
+				self.make_snapshots()
+			case Command.DISABLE:
+				self.bells_enabled = False
+				self.player.stop()
+				self.bus.publish(Event.ENABLED, False)
+				self.make_snapshots()
+			case Command.RELOAD:
+				self.reload_config(force=arg is not False)
+			case Command.PLAY:
+				sound, zone_name = arg
+				zone = next((zone for zone in self.zones if zone.name == zone_name), self.zones[0])
+				self.player.play(zone.sound_file(sound), None, zone.output, SOUND_PRIORITIES[sound])
+			case Command.QUIT:
+				self.watcher.close()
+				self.ticker.close()
+				self.journal.flush()
+				return True
+		return False
+
+	def send(self, command: Command, arg=None) -> None:
+		# from any thread, handled by the scheduler thread
+		self.commands.put((command, arg))
+
+	def close(self) -> None:
+		if self.thread is not None:
+			self.send(Command.QUIT)
+			self.thread.join(1)
+
+	def settings(self) -> Settings:
+		return Settings(tuple(self.lessons_start), tuple(self.silent_minute), self.lesson_length, self.break_time, self.first_bell, self.num_lessons, tuple(self.workdays), self.bell_sound_files)
+
+	def apply_settings(self, settings: Settings) -> None:
+		self.lessons_start, self.silent_minute, self.lesson_length, self.break_time, self.first_bell, self.num_lessons, self.workdays, self.bell_sound_files = settings
 
 	def generate_bells(self) -> None:
-		self.apply_config()
-		
-		self.bells = []
-		if not self.workdays[time.localtime().tm_wday]:
-			self.ui.set_schedule(self.get_bells_list())
-			return
+		# only the zones whose schedule changed are compiled again, the played bells stay played
+		previous = {zone.name: zone for zone in self.zones}
+		zones = self.prepare_zones()
+		# all of them, not only the new names: a file replaced under the same name has to be decoded again,
+		# and the ones that are still valid cost preload nothing
+		self.player.preload({(file_name, zone.output) for zone in zones for file_name in zone.sound_files})
+		with self.lock:
+			self.zones = zones
+		self.build_bells(compile_timeline=False, previous=previous)
+
+	def prepare_zones(self) -> list[Zone]:
+		# the zones of the current config with their timelines compiled. nothing is changed here,
+		# so if the config is broken this raises and the bells go on with the old zones
+		zones = self.make_zones()
+		previous = {zone.name: zone for zone in self.zones}
+		for zone in zones:
+			old = previous.get(zone.name)
+			if old is not None and old.schedule == zone.schedule:
+				zone.timeline = old.timeline
+		t = time.localtime(self.clock.time())
+		self.compile_timelines(zones, datetime.date(t.tm_year, t.tm_mon, t.tm_mday))
+		return zones
+
+	def compile_timelines(self, zones: list[Zone], today: datetime.date, force: bool = False) -> None:
+		timelines = {} # zones with the same schedule share the timeline
+		for zone in zones:
+			if force or zone.timeline is None or not zone.timeline.covers(today):
+				key = json.dumps(zone.schedule, sort_keys=True)
+				if key not in timelines:
+					timelines[key] = timeline.load_or_compile(zone.schedule, today, self.zone_timeline_file(zone))
+				zone.timeline = timelines[key]
+
+	def schedule_config(self, zone_config: dict = None) -> dict:
+		# everything the timeline depends on
+		config = {field: getattr(self, field) for field in SCHEDULE_FIELDS}
+		if zone_config:
+			config |= {field: zone_config[field] for field in SCHEDULE_FIELDS if field in zone_config}
+		for field in ("lessons_start", "silent_minute", "workdays"): # lists when they come from json
+			config[field] = tuple(config[field])
+		return config
+
+	def make_zones(self) -> list[Zone]:
+		zones = [Zone(0, MAIN_ZONE, self.schedule_config(), self.bell_sound_files, self.output)]
+		for name, zone_config in self.zone_configs.items():
+			sound_files = self.bell_sound_files
+			if "sound_files" in zone_config:
+				sf = zone_config["sound_files"]
+				sound_files = (sf["first_bell"], sf["second_bell"], sf["break"], sf["silent_minute"])
+			zones.append(Zone(len(zones), name, self.schedule_config(zone_config), sound_files, zone_config.get("output", self.output)))
+		return zones
 
-		self.bells.append(Bell(SoundType.SILENT_MINUTE, *self.silent_minute))
-		day_minute: int = self.lessons_start[0] * 60 + self.lessons_start[1] - self.first_bell
-		for lesson_number in range(self.num_lessons):
-			if day_minute >= 0: # so that the lessons can't possibly start yesterday
-				self.bells.append(Bell(SoundType.FIRST_BELL, day_minute // 60, day_minute % 60))
-			day_minute += self.first_bell
-			self.bells.append(Bell(SoundType.SECOND_BELL, day_minute // 60, day_minute % 60))
-			day_minute += self.lesson_length
-			self.bells.append(Bell(SoundType.BREAK, day_minute // 60, day_minute % 60))
-			day_minute += self.break_time - self.first_bell
+	def zone_timeline_file(self, zone: Zone) -> str:
+		if self.timeline_file is None or zone.zone_id == 0:
+			return self.timeline_file
+		root, ext = os.path.splitext(self.timeline_file)
+		return f"{root}.{zone.zone_id}{ext}"
 
-		self.bells = [bell for bell in self.bells if bell.hour <= 23]
-		self.bells.sort(key=lambda bell: bell.hour * 60 + bell.minute)
+	def build_bells(self, compile_timeline: bool = True, previous: dict = None) -> None:
+		# previous has the zones by name before a rebuild, the bells they have played today are carried over
+		now = self.clock.time()
+		t = time.localtime(now)
+		today = datetime.date(t.tm_year, t.tm_mon, t.tm_mday)
+		if previous is None or self.day != (t.tm_year, t.tm_yday):
+			previous = {}
+		if self.day != (t.tm_year, t.tm_yday):
+			self.skipped = set()
+		self.day = (t.tm_year, t.tm_yday)
+		self.day_span = (time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1)), time.mktime((t.tm_year, t.tm_mon, t.tm_mday + 1, 0, 0, 0, 0, 0, -1)))
+		days = {}
+		changed = [] # zones whose bells aren't the ones they had, these are journaled as scheduled
+		with self.lock:
+			self.compile_timelines(self.zones, today, compile_timeline)
+			for zone in self.zones:
+				old_table = previous[zone.name].table if zone.name in previous else zone.table
+				zone.build(today, t, days)
+				if old_table.fire_times != zone.table.fire_times or old_table.sounds != zone.table.sounds:
+					changed.append(zone)
+				if zone.name in previous:
+					zone.carry_played(previous[zone.name])
+			if not previous: # a new day, or the program was just started
+				self.restore_played()
+			self.schedule_version += 1
+			self.seek(now)
+			for zone in changed:
+				for bell_n in range(zone.next_bell, len(zone.table)):
+					self.journal.write(Kind.SCHEDULED, zone.key, zone.table.sound(bell_n), zone.table.fire_times[bell_n], now)
+		self.show_schedule()
+		self.make_snapshots()
 
-		self.ui.set_schedule(self.get_bells_list())
+	def show_schedule(self) -> None:
+		# the table itself is read only, only the played flags are copied
+		zone = self.zones[0]
+		self.bus.publish(Event.SCHEDULE, (self.day, zone.table, zone.played.flags(len(zone.table)), zone.next_bell))
 
-	def get_bells_list(self) -> list[str]:
-		return [f"{bell.hour:02}:{bell.minute:02} - {BELL_NAMES[bell.sound]}" for bell in self.bells]
+	def restore_played(self) -> None:
+		# what the journal says has already happened today, so that a restart doesn't ring the bells again
+		zones = {zone.key: zone for zone in self.zones}
+		for fire_time, at, key, kind, sound in self.journal.recent(self.day_span[0]):
+			if key not in zones or kind == Kind.SCHEDULED.value: # a zone that is gone from the config
+				continue
+			if kind == Kind.SKIPPED.value:
+				self.skipped.add((key, fire_time))
+				continue
+			zone = zones[key]
+			bell_n = zone.table.index(fire_time)
+			if bell_n < len(zone.table) and zone.table.fire_times[bell_n] == fire_time:
+				zone.played.add(bell_n)
 
-	def menu_event(self, button) -> None:
+	def seek(self, now: float) -> None:
+		self.events = []
+		for zone in self.zones:
+			zone.seek(now, LATE_LIMIT)
+			for bell_n in range(zone.next_bell):
+				if bell_n not in zone.played:
+					self.skip(zone, bell_n, now)
+			if zone.next_bell < len(zone.table):
+				self.events.append((zone.table.fire_times[zone.next_bell], zone.zone_id))
+		heapq.heapify(self.events)
+
+
+	def menu_event(self, button, settings: Settings = None) -> None:
+		# called from the gui thread, only queues the command, so it never waits for the scheduler
 		match button:
-			case 0: self.generate_bells()
-			case 1: self.save_config()
-			case 2: self.bells_enabled = True
-			case 3: self.bells_enabled = False
+			case 0: self.send(Command.APPLY, settings)
+			case 1: self.send(Command.SAVE, settings)
+			case 2: self.send(Command.ENABLE)
+			case 3: self.send(Command.DISABLE)
+
+	def update(self) -> float:
+		# returns the number of seconds until it has to be called again
+		now = self.clock.time()
+		clock_offset = now - self.clock.monotonic()
+		if abs(clock_offset - self.clock_offset) > CLOCK_JUMP: # someone changed the system time
+			self.seek(now)
+		self.clock_offset = clock_offset
+
+		if not self.day_span[0] <= now < self.day_span[1]: # compared as floats, so that a tick with nothing due allocates nothing
+			if now >= self.day_span[1]: # what is left of the day that has ended never rang (the bells were disabled)
+				for zone in self.zones:
+					for bell_n in range(zone.next_bell, len(zone.table)):
+						if bell_n not in zone.played:
+							self.skip(zone, bell_n, now)
+			self.build_bells(compile_timeline=False) # just a lookup in the already compiled timeline
 
-	def update(self):
 		if not self.bells_enabled:
+			return MAX_SLEEP # the bells will be rescheduled when enabled again
+
+		# one merged queue for all of the zones, so the number of wakeups doesn't depend on the number of zones
+		rang = False
+		while self.events and self.events[0][0] <= now + EARLY_MARGIN:
+			fire_time, zone_id = self.events[0]
+			zone = self.zones[zone_id]
+			bell_n = zone.next_bell
+			zone.next_bell += 1
+			if zone.next_bell < len(zone.table):
+				heapq.heapreplace(self.events, (zone.table.fire_times[zone.next_bell], zone_id))
+			else:
+				heapq.heappop(self.events)
+			if bell_n in zone.played:
+				continue
+			if now - fire_time > LATE_LIMIT:
+				self.skip(zone, bell_n, now)
+				continue
+			self.ring(zone, bell_n, now)
+			rang = True
+		if rang:
+			self.make_snapshots()
+
+		if self.events:
+			delay = self.events[0][0] - now
+		else: # wake up at midnight to build the next day
+			delay = self.day_span[1] - now
+		return max(0, min(delay, MAX_SLEEP))
+
+	def upcoming(self, now: float, horizon: float) -> tuple:
+		# (version, enabled, bells in the next horizon seconds) for the network agents
+		events = []
+		with self.lock:
+			if not self.bells_enabled:
+				return self.schedule_version, False, events
+			for zone in self.zones:
+				table = zone.table
+				for bell_n in range(zone.next_bell, table.index(now + horizon)):
+					fire_time = table.fire_times[bell_n]
+					events.append({"id": f"{zone.zone_id}/{fire_time}", "zone": zone.name, "sound": table.sounds[bell_n], "fire_at": fire_time})
+			return self.schedule_version, self.bells_enabled, events
+
+	def make_snapshots(self) -> None:
+		# the api answers from these, so polling it costs the scheduler nothing
+		if self.snapshots is None:
 			return
-		t = time.localtime()
-		for bell_n, bell in enumerate(self.bells):
-			if (not bell.played) and (bell.hour == t.tm_hour) and (bell.minute == t.tm_min):
-				bell.played = True
-				self.ui.select_bell(bell_n)
-				match bell.sound:
-					case SoundType.FIRST_BELL:    playsound(self.bell_sound_files[0])
-					case SoundType.SECOND_BELL:   playsound(self.bell_sound_files[1])
-					case SoundType.BREAK:         playsound(self.bell_sound_files[2])
-					case SoundType.SILENT_MINUTE: playsound(self.bell_sound_files[3])
-				return # there should be, in practice, no bells left. if you want to play two at the same time, what's wrong with you?
+		def bell(zone, bell_n):
+			hour, minute = zone.table.time_of_day(bell_n)
+			return {"time": f"{hour:02}:{minute:02}", "sound": zone.table.sound(bell_n).name.lower(), "fire_at": zone.table.fire_times[bell_n], "played": bell_n in zone.played}
+		status = {"enabled": self.bells_enabled, "version": self.schedule_version, "zones": {}}
+		schedule = {"date": time.strftime("%Y-%m-%d", time.localtime(self.day_span[0])), "zones": {}}
+		with self.lock:
+			for zone in self.zones:
+				current = next((bell_n for bell_n in reversed(range(zone.next_bell)) if bell_n in zone.played), None)
+				status["zones"][zone.name] = {
+					"current": bell(zone, current) if current is not None else None,
+					"next": bell(zone, zone.next_bell) if zone.next_bell < len(zone.table) else None
+				}
+				schedule["zones"][zone.name] = [bell(zone, bell_n) for bell_n in range(len(zone.table))]
+		self.snapshots = {"/status": json.dumps(status, ensure_ascii=False).encode(), "/schedule": json.dumps(schedule, ensure_ascii=False).encode()} # replaced as a whole, never changed
+
+	def ring(self, zone: Zone, bell_n: int, now: float) -> None:
+		sound = zone.table.sound(bell_n)
+		fire_time = zone.table.fire_times[bell_n]
+		zone.played.add(bell_n)
+		self.journal.write(Kind.LATE if now - fire_time > LATE_MARK else Kind.FIRED, zone.key, sound, fire_time, now)
+		record = BellRecord(sound, fire_time, now, zone=zone.zone_id)
+		self.player.play(zone.sound_file(sound), record, zone.output, SOUND_PRIORITIES[sound])
+		if zone.zone_id == 0:
+			self.bus.publish(Event.BELL, (bell_n, now - fire_time))
+
+	def skip(self, zone: Zone, bell_n: int, now: float) -> None:
+		fire_time = zone.table.fire_times[bell_n]
+		if (zone.key, fire_time) not in self.skipped: # seek goes over the same ones on every rebuild
+			self.skipped.add((zone.key, fire_time))
+			self.journal.write(Kind.SKIPPED, zone.key, zone.table.sound(bell_n), fire_time, now)
+
+	def bell_recorded(self, record) -> None:
+		# called from the player thread
+		self.metrics.add(record)
+		self.metrics.dump()
+		if self.bus.notify is not None:
+			self.bus.publish(Event.METRICS, self.metrics.summary())
 
 	def load_config(self):
+		# the zones are compiled right away, a config that can't be is as good as a missing one
 		try:
-			with open("config.json", "r") as fp:
+			self.config_stat = file_stat(CONFIG_FILE)
+			with open(CONFIG_FILE, "r") as fp:
 				self.parse_config(json.load(fp))
-		except (json.JSONDecodeError, OSError, KeyError):
+			self.zones = self.prepare_zones()
+		except CONFIG_ERRORS:
+			if self.config_stat is not None:
+				log_error(f"{CONFIG_FILE} пошкоджено, використовуються типові налаштування")
 			self.parse_config(DEFAULT_CONFIG) # now this shouldn't fail, or else you screwed up the default config 
+			self.zones = self.prepare_zones()
+
+	def reload_config(self, force: bool = True) -> None:
+		# config.json was changed by someone else, a broken or half written file is ignored until it changes again
+		stat = file_stat(CONFIG_FILE)
+		if stat is None or (stat == self.config_stat and not force):
+			return
+		old_config, old_settings, old_zones = self.config_fields(), self.settings(), self.zones_config()
+		try:
+			with open(CONFIG_FILE, "r") as fp:
+				self.parse_config(json.load(fp))
+			if self.zones_config() != old_zones: # otherwise only the calendar-less fields changed
+				self.generate_bells() # swaps the zones in only if all of them compile
+		except CONFIG_ERRORS:
+			log_error(f"{CONFIG_FILE} пошкоджено, залишено попередні налаштування")
+			self.restore_config_fields(old_config)
+			return
+		self.config_stat = stat
+		if self.volume != old_config["volume"]:
+			self.player.set_volume(self.volume)
+		if self.settings() != old_settings:
+			self.bus.publish(Event.SETTINGS, self.settings())
+
+	def config_fields(self) -> dict:
+		return {field: getattr(self, field) for field in CONFIG_FIELDS}
+
+	def restore_config_fields(self, fields: dict) -> None:
+		for field, value in fields.items():
+			setattr(self, field, value)
+
+	def zones_config(self) -> tuple:
+		# everything the zones are made of
+		return self.schedule_config(), self.bell_sound_files, self.output, self.zone_configs
 
 	def parse_config(self, config):
 		match config["version"]:
-			case 0 | self.CONFIG_VERSION:
+			case 0 | 1 | 2 | self.CONFIG_VERSION:
+				config = DEFAULT_CONFIG | config # older versions just lack the newer fields
+				sf = config["sound_files"] # first, so that a broken one fails before anything is changed
+				self.bell_sound_files = (sf["first_bell"], sf["second_bell"], sf["break"], sf["silent_minute"])
 				self.lessons_start = config["lessons_start"]
 				self.silent_minute = config["silent_minute"]
 				self.lesson_length = config["lesson_length"]
@@ -132,26 +477,45 @@ class Scheduler:
 				self.first_bell    = config["first_bell"]
 				self.num_lessons   = config["num_lessons"]
 				self.workdays      = config["workdays"]
-				sf = config["sound_files"]
-				self.bell_sound_files = (sf["first_bell"], sf["second_bell"], sf["break"], sf["silent_minute"])
+				self.volume        = config["volume"]
+				self.term          = config["term"]
+				self.holidays      = config["holidays"]
+				self.short_days    = config["short_days"]
+				self.overrides     = config["overrides"]
+				self.output        = config["output"]
+				self.zone_configs  = config["zones"]
 
-	def save_config(self):
-		with open("config.json", "w") as fp:
-			c = self.ui.get_settings()
-			config = {
-				"version":       CONFIG_VERSION,
-				"lessons_start": c[0],
-				"silent_minute": c[1],
-				"lesson_length": c[2],
-				"break_time":    c[3],
-				"first_bell":    c[4],
-				"num_lessons":   c[5],
-				"workdays":      c[6],
-				"sound_files": {
-					"first_bell":    c[7][0],
-					"second_bell":   c[7][1],
-					"break":         c[7][2],
-					"silent_minute": c[7][3]
-				}
+	def save_config(self, settings: Settings = None):
+		# the settings from the window, which don't have to be applied yet
+		c = settings if settings is not None else self.settings()
+		config = {
+			"version":       CONFIG_VERSION,
+			"lessons_start": c[0],
+			"silent_minute": c[1],
+			"lesson_length": c[2],
+			"break_time":    c[3],
+			"first_bell":    c[4],
+			"num_lessons":   c[5],
+			"workdays":      c[6],
+			"volume":        self.volume,
+			"term":          self.term,
+			"holidays":      self.holidays,
+			"short_days":    self.short_days,
+			"overrides":     self.overrides,
+			"output":        self.output,
+			"zones":         self.zone_configs,
+			"sound_files": {
+				"first_bell":    c[7][0],
+				"second_bell":   c[7][1],
+				"break":         c[7][2],
+				"silent_minute": c[7][3]
 			}
+		}
+		# written aside and renamed over the old one, so that a crash in the middle never leaves half a config
+		temp_name = CONFIG_FILE + ".tmp"
+		with open(temp_name, "w") as fp:
 			json.dump(config, fp)
+			fp.flush()
+			os.fsync(fp.fileno())
+		os.replace(temp_name, CONFIG_FILE)
+		self.config_stat = file_stat(CONFIG_FILE)
@@ -0,0 +1,145 @@
+import argparse, datetime, json
+from dataclasses import dataclass
+import numpy
+from bells import SoundType, BELL_NAMES
+from timeline import DAY_MINUTES, epoch_day, to_date, parse_date, holiday_days, school_year
+
+# every bell of every day of a term at once, to check a timetable before it's applied:
+#   python simulate.py                                   - the term from config.json
+#   python simulate.py --from 2024-09-01 --to 2024-12-31
+# the normal days are computed as arrays (days x lessons), only the override days go one by one.
+# unlike the timeline, the bells outside of the day are kept here and reported
+
+OUT_OF_RANGE = "out_of_range" # before midnight or after the end of the day, the timeline drops them
+SILENT_MINUTE = "silent_minute" # another bell in the same minute as the silent minute
+DUPLICATE = "duplicate"       # two bells in the same minute
+
+CONFLICT_NAMES = {
+	OUT_OF_RANGE:  "поза межами доби",
+	SILENT_MINUTE: "збігається з хвилиною мовчання",
+	DUPLICATE:     "два дзвінки в одну хвилину"
+}
+
+@dataclass
+class Conflict:
+	date: datetime.date
+	minute: int # of the day, may be negative or past the end of it for OUT_OF_RANGE
+	sound: SoundType
+	kind: str
+
+	def __str__(self) -> str:
+		hour, minute = divmod(abs(self.minute), 60)
+		sign = "-" if self.minute < 0 else "" # that many minutes before the midnight
+		return f"{self.date} {sign}{hour:02}:{minute:02} {BELL_NAMES[self.sound]} - {CONFLICT_NAMES[self.kind]}"
+
+@dataclass
+class Simulation:
+	days: numpy.ndarray    # epoch day of every bell, sorted by day and then by minute
+	minutes: numpy.ndarray # minute of the day
+	sounds: numpy.ndarray  # SoundType values
+	valid: numpy.ndarray   # False for the bells the timeline would drop
+	conflicts: list[Conflict]
+
+	def last_bells(self) -> dict:
+		# date -> minute of the day of its last bell, for every day that has bells
+		days, minutes = self.days[self.valid], self.minutes[self.valid]
+		ends = numpy.flatnonzero(numpy.diff(days, append=days[-1:] + 1)) if len(days) else numpy.zeros(0, int)
+		return {to_date(int(day)): int(minute) for day, minute in zip(days[ends], minutes[ends])}
+
+	def stats(self) -> dict:
+		days, minutes = self.days[self.valid], self.minutes[self.valid]
+		last_bells = list(self.last_bells().values())
+		return {
+			"school_days": len(last_bells),
+			"bells": int(self.valid.sum()),
+			"earliest_bell": int(minutes.min()) if len(minutes) else None,
+			"latest_bell": int(minutes.max()) if len(minutes) else None,
+			"mean_last_bell": float(numpy.mean(last_bells)) if last_bells else None,
+			"conflicts": {kind: sum(conflict.kind == kind for conflict in self.conflicts) for kind in CONFLICT_NAMES}
+		}
+
+def normal_bells(config: dict, days: numpy.ndarray, lesson_lengths: numpy.ndarray) -> tuple:
+	# (minutes, sounds) of the normal days, days x bells, in the same order as timeline.day_bells puts them
+	lessons = numpy.arange(config["num_lessons"])
+	first_bell, break_time = config["first_bell"], config["break_time"]
+	starts = config["lessons_start"][0] * 60 + config["lessons_start"][1] + lessons * (lesson_lengths[:, None] + break_time)
+	per_lesson = numpy.stack((starts - first_bell, starts, starts + lesson_lengths[:, None]), axis=2).reshape(len(days), 3 * len(lessons))
+	silent = numpy.full((len(days), 1), config["silent_minute"][0] * 60 + config["silent_minute"][1])
+	minutes = numpy.concatenate((silent, per_lesson), axis=1)
+	sounds = numpy.array([SoundType.SILENT_MINUTE.value] + [SoundType.FIRST_BELL.value, SoundType.SECOND_BELL.value, SoundType.BREAK.value] * len(lessons))
+	return minutes, numpy.broadcast_to(sounds, minutes.shape)
+
+def simulate(config: dict, first_day: datetime.date, last_day: datetime.date) -> Simulation:
+	days = numpy.arange(epoch_day(first_day), epoch_day(last_day) + 1)
+	holidays = numpy.fromiter(holiday_days(config["holidays"]), dtype=numpy.int64)
+	overrides = {epoch_day(parse_date(date)): bells for date, bells in config["overrides"].items()}
+	override_days = numpy.fromiter(overrides, dtype=numpy.int64)
+	workdays = numpy.array(config["workdays"], dtype=bool)
+	normal = workdays[(days + 3) % 7] & ~numpy.isin(days, holidays) & ~numpy.isin(days, override_days) # 1970-01-01 was a thursday
+	normal_days = days[normal]
+
+	# the lesson length of every day, the short days have their own
+	lesson_lengths = numpy.full(len(normal_days), config["lesson_length"])
+	if config["short_days"]:
+		short_days = numpy.array([epoch_day(parse_date(date)) for date in config["short_days"]])
+		short_lengths = numpy.array(list(config["short_days"].values()))
+		order = numpy.argsort(short_days)
+		short_days, short_lengths = short_days[order], short_lengths[order]
+		index = numpy.minimum(numpy.searchsorted(short_days, normal_days), len(short_days) - 1)
+		short = short_days[index] == normal_days
+		lesson_lengths[short] = short_lengths[index[short]]
+
+	minutes, sounds = normal_bells(config, normal_days, lesson_lengths)
+	all_days = [numpy.repeat(normal_days, minutes.shape[1])]
+	all_minutes, all_sounds = [minutes.ravel()], [sounds.ravel()]
+	for day in override_days[(override_days >= days[0]) & (override_days <= days[-1])] if len(days) else ():
+		bells = overrides[day]
+		all_days.append(numpy.full(len(bells), day))
+		all_minutes.append(numpy.array([hour * 60 + minute for hour, minute, sound in bells], dtype=numpy.int64))
+		all_sounds.append(numpy.array([sound for hour, minute, sound in bells], dtype=numpy.int64))
+	days, minutes, sounds = numpy.concatenate(all_days), numpy.concatenate(all_minutes), numpy.concatenate(all_sounds)
+	order = numpy.lexsort((minutes, days)) # stable, the bells of the same minute keep their order
+	days, minutes, sounds = days[order], minutes[order], sounds[order]
+
+	valid = (minutes >= 0) & (minutes < DAY_MINUTES)
+	kinds = numpy.full(len(days), "", dtype=object)
+	kinds[~valid] = OUT_OF_RANGE
+	same = valid[1:] & valid[:-1] & (days[1:] == days[:-1]) & (minutes[1:] == minutes[:-1]) # with the next bell
+	silent = (sounds[1:] == SoundType.SILENT_MINUTE.value) | (sounds[:-1] == SoundType.SILENT_MINUTE.value)
+	for kind, pairs in ((DUPLICATE, same & ~silent), (SILENT_MINUTE, same & silent)):
+		kinds[numpy.flatnonzero(pairs)] = kind
+		kinds[numpy.flatnonzero(pairs) + 1] = kind
+	conflicts = [Conflict(to_date(int(days[i])), int(minutes[i]), SoundType(int(sounds[i])), kinds[i]) for i in numpy.flatnonzero(kinds != "")]
+	return Simulation(days, minutes, sounds, valid, conflicts)
+
+if __name__ == "__main__":
+	from scheduler import DEFAULT_CONFIG, CONFIG_FILE
+	parser = argparse.ArgumentParser(description="SBC - перевірка розкладу на весь семестр")
+	parser.add_argument("--config", default=CONFIG_FILE)
+	parser.add_argument("--from", dest="first_day", type=parse_date)
+	parser.add_argument("--to", dest="last_day", type=parse_date)
+	args = parser.parse_args()
+	try:
+		with open(args.config) as fp:
+			config = DEFAULT_CONFIG | json.load(fp)
+	except FileNotFoundError:
+		config = DEFAULT_CONFIG
+	if config["term"]: # checked even if it isn't the current one, unlike what the scheduler compiles
+		first_day, last_day = parse_date(config["term"][0]), parse_date(config["term"][1])
+	else:
+		first_day, last_day = school_year(datetime.date.today())
+
+	zones = {"": config} | {name: config | zone for name, zone in config["zones"].items()}
+	for name, zone_config in zones.items():
+		result = simulate(zone_config, args.first_day or first_day, args.last_day or last_day)
+		stats = result.stats()
+		if name:
+			print(f"\n{name}:")
+		print(f"Навчальних днів: {stats['school_days']}, дзвінків: {stats['bells']}")
+		if stats["bells"]:
+			print(f"Найраніший дзвінок: {stats['earliest_bell'] // 60:02}:{stats['earliest_bell'] % 60:02}, найпізніший: {stats['latest_bell'] // 60:02}:{stats['latest_bell'] % 60:02}")
+		for date, minute in result.last_bells().items():
+			if date.isoformat() in zone_config["short_days"]:
+				print(f"Скорочений день {date}: останній дзвінок о {minute // 60:02}:{minute % 60:02}")
+		for conflict in result.conflicts:
+			print(conflict)
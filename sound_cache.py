@@ -0,0 +1,66 @@
+import os
+import soundfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from stream import conform, resample
+from transcode import DiskCache, normalize
+
+MEMORY_BUDGET = 64 * 1024 * 1024 # bytes of decoded pcm
+STREAM_SECONDS = 30 # longer sounds (the anthem, music) are streamed from the file instead
+
+@dataclass
+class CacheEntry:
+	mtime: int
+	file_size: int
+	data: object # numpy array, frames x channels, float32
+	samplerate: int
+
+class SoundCache:
+	def __init__(self, budget: int = MEMORY_BUDGET) -> None:
+		self.budget = budget
+		self.size: int = 0
+		self.entries: OrderedDict[tuple, CacheEntry] = OrderedDict() # (file name, samplerate, channels), least recently used first
+		self.disk = DiskCache() # prepared sounds, used instead as soon as they are ready
+
+	def get(self, file_name: str, samplerate: int, channels: int):
+		# pcm in the format of the mixer, None if the sound should be streamed
+		key = (file_name, samplerate, channels)
+		data = self.disk.get(file_name, samplerate, channels)
+		if data is not None: # memory mapped, no matter how long it is
+			self.remove(key)
+			return data
+		stat = os.stat(file_name)
+		entry = self.entries.get(key)
+		if entry is not None and entry.mtime == stat.st_mtime_ns and entry.file_size == stat.st_size:
+			self.entries.move_to_end(key)
+			return entry.data
+
+		# missing or the file was changed on disk
+		self.remove(key)
+		if soundfile.info(file_name).duration > STREAM_SECONDS:
+			return None
+		data, file_rate = soundfile.read(file_name, dtype="float32", always_2d=True)
+		# trimmed and brought to the same loudness as the prepared one, so the bell sounds the same before and after it's ready
+		data = normalize(resample(conform(data, channels), file_rate, samplerate), samplerate)
+		if data.nbytes <= self.budget:
+			self.entries[key] = CacheEntry(stat.st_mtime_ns, stat.st_size, data, samplerate)
+			self.size += data.nbytes
+			self.evict()
+		return data
+
+	def preload(self, file_name: str, samplerate: int, channels: int) -> None:
+		self.disk.request(file_name, samplerate, channels)
+		try:
+			self.get(file_name, samplerate, channels)
+		except (RuntimeError, OSError):
+			self.remove((file_name, samplerate, channels)) # will fail again when played, nothing else to do here
+
+	def remove(self, key: tuple) -> None:
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			self.size -= entry.data.nbytes
+
+	def evict(self) -> None:
+		while self.size > self.budget:
+			_, entry = self.entries.popitem(last=False)
+			self.size -= entry.data.nbytes
@@ -0,0 +1,166 @@
+import threading, struct, os
+import numpy, soundfile
+
+# long sounds are never decoded as a whole: a decoder thread fills a small ring buffer
+# block by block, and the mixer takes the samples from it
+
+RING_SECONDS = 2
+BLOCK_FRAMES = 4096
+
+def conform(block, channels: int):
+	# mono to every output channel, extra channels dropped
+	if block.shape[1] == channels:
+		return block
+	if block.shape[1] == 1:
+		return numpy.repeat(block, channels, axis=1)
+	if block.shape[1] > channels:
+		return block[:, :channels]
+	return numpy.pad(block, ((0, 0), (0, channels - block.shape[1])))
+
+class RingBuffer:
+	def __init__(self, frames: int, channels: int) -> None:
+		self.data = numpy.zeros((frames, channels), dtype=numpy.float32)
+		self.read_pos: int = 0  # frames read since the start, the positions only ever grow
+		self.write_pos: int = 0
+		self.closed: bool = False    # the writer has nothing more
+		self.cancelled: bool = False # the reader doesn't want anything more
+		self.condition = threading.Condition()
+
+	def write(self, block) -> bool:
+		# blocks while the buffer is full, returns False if the playback was cancelled
+		size = len(self.data)
+		offset = 0
+		while offset < len(block):
+			with self.condition:
+				while self.write_pos - self.read_pos >= size and not self.cancelled:
+					self.condition.wait()
+				if self.cancelled:
+					return False
+				count = min(size - (self.write_pos - self.read_pos), len(block) - offset)
+			# the reader never touches the free part, so the copy doesn't need the lock
+			start = self.write_pos % size
+			first = min(count, size - start)
+			self.data[start:start + first] = block[offset:offset + first]
+			self.data[:count - first] = block[offset + first:offset + count]
+			with self.condition:
+				self.write_pos += count
+			offset += count
+		return True
+
+	def read(self, out) -> int:
+		# never waits, returns how many frames were copied to out
+		size = len(self.data)
+		with self.condition:
+			count = min(self.write_pos - self.read_pos, len(out))
+		start = self.read_pos % size
+		first = min(count, size - start)
+		out[:first] = self.data[start:start + first]
+		out[first:count] = self.data[:count - first]
+		with self.condition:
+			self.read_pos += count
+			self.condition.notify()
+		return count
+
+	def close(self) -> None:
+		with self.condition:
+			self.closed = True
+
+	def cancel(self) -> None:
+		with self.condition:
+			self.cancelled = True
+			self.condition.notify()
+
+	def drained(self) -> bool:
+		with self.condition:
+			return self.closed and self.read_pos == self.write_pos
+
+def wav_source(file_name: str):
+	# plain 16 bit or float wav files are memory mapped instead of read, None for anything else
+	with open(file_name, "rb") as fp:
+		riff, _, wave = struct.unpack("<4sI4s", fp.read(12))
+		if riff != b"RIFF" or wave != b"WAVE":
+			return None
+		fmt = None
+		while True:
+			header = fp.read(8)
+			if len(header) < 8:
+				return None
+			chunk_id, chunk_size = struct.unpack("<4sI", header)
+			if chunk_id == b"data":
+				offset = fp.tell()
+				break
+			if chunk_id == b"fmt ":
+				fmt = struct.unpack("<HHIIHH", fp.read(16))
+				chunk_size -= 16
+			fp.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+	if fmt is None:
+		return None
+	tag, channels, samplerate, _, _, bits = fmt
+	match (tag, bits):
+		case (1, 16) | (0xFFFE, 16): dtype, scale = "<i2", 1 / 32768
+		case (3, 32):                dtype, scale = "<f4", 1
+		case _:                      return None
+	frames = min(chunk_size, os.path.getsize(file_name) - offset) // (channels * bits // 8)
+	data = numpy.memmap(file_name, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+	blocks = (data[i:i + BLOCK_FRAMES].astype(numpy.float32) * numpy.float32(scale) for i in range(0, frames, BLOCK_FRAMES))
+	return samplerate, channels, blocks
+
+def open_source(file_name: str):
+	# (samplerate, channels, iterator over float32 blocks)
+	source = wav_source(file_name)
+	if source is not None:
+		return source
+	info = soundfile.info(file_name)
+	return info.samplerate, info.channels, soundfile.blocks(file_name, blocksize=BLOCK_FRAMES, dtype="float32", always_2d=True)
+
+class Resampler:
+	# linear interpolation, keeps its position between the blocks so that there are no clicks at their borders
+	def __init__(self, from_rate: int, to_rate: int) -> None:
+		self.step = from_rate / to_rate
+		self.position: float = 0 # in input frames, 0 is self.last if there is one
+		self.last = None
+
+	def process(self, block):
+		if self.step == 1:
+			return block
+		if self.last is not None:
+			block = numpy.concatenate((self.last[None], block))
+		positions = numpy.arange(self.position, len(block) - 1, self.step)
+		index = positions.astype(numpy.int64)
+		fraction = (positions - index).astype(numpy.float32)[:, None]
+		out = block[index] * (1 - fraction) + block[index + 1] * fraction
+		self.position = (positions[-1] + self.step if len(positions) else self.position) - (len(block) - 1)
+		self.last = block[-1]
+		return out
+
+def resample(data, from_rate: int, to_rate: int):
+	return Resampler(from_rate, to_rate).process(data)
+
+class StreamSource:
+	# a mixer source that decodes the file in its own thread, only RING_SECONDS of it are ever in memory
+	def __init__(self, file_name: str, samplerate: int, channels: int) -> None:
+		file_rate, file_channels, blocks = open_source(file_name)
+		self.ring = RingBuffer(RING_SECONDS * samplerate, channels)
+		self.channels = channels
+		self.resampler = Resampler(file_rate, samplerate)
+		self.decoder = threading.Thread(target=self.decode, args=(blocks,), name="decoder", daemon=True)
+		self.decoder.start()
+
+	def decode(self, blocks) -> None:
+		try:
+			for block in blocks:
+				if not self.ring.write(self.resampler.process(conform(block, self.channels))):
+					return
+		except (RuntimeError, OSError, ValueError): # a broken file, whatever was decoded of it is played
+			pass
+		finally:
+			self.ring.close() # always, or the mixer would wait for the rest forever
+
+	def read(self, out) -> int:
+		return self.ring.read(out)
+
+	def drained(self) -> bool:
+		return self.ring.drained()
+
+	def cancel(self) -> None:
+		self.ring.cancel()
@@ -0,0 +1,86 @@
+import threading
+from clock import SystemClock
+
+# one thread for all of the periodic work that isn't a bell (the clock in the window, watching the config):
+# every subscriber says how often it needs to run, the thread sleeps until the nearest deadline and runs
+# everything that is due within SLACK of it in the same wakeup. the bells have their own precise thread.
+
+SLACK = 0.05 # seconds, deadlines this close together share a wakeup
+
+class Subscription:
+	def __init__(self, ticker, callback, interval: float, align: bool) -> None:
+		self.ticker = ticker
+		self.callback = callback
+		self.interval = interval
+		self.align = align   # run on whole multiples of the interval of the wall clock, for things that show the time
+		self.deadline: float = 0 # monotonic
+		self.paused: bool = False
+
+	def schedule(self, now: float, wall: float) -> None:
+		if self.align:
+			self.deadline = now + self.interval - wall % self.interval
+			if self.deadline - now <= SLACK: # woken up a little before the boundary, that one is done
+				self.deadline += self.interval
+		else:
+			self.deadline = now + self.interval
+
+	def pause(self) -> None:
+		# nothing runs, and no wakeups are spent on it, until resumed
+		with self.ticker.condition:
+			self.paused = True
+
+	def resume(self) -> None:
+		with self.ticker.condition:
+			self.paused = False
+			self.schedule(self.ticker.clock.monotonic(), self.ticker.clock.time())
+			self.ticker.condition.notify()
+		self.callback() # right away, not after a whole interval
+
+	def cancel(self) -> None:
+		with self.ticker.condition:
+			if self in self.ticker.subscriptions:
+				self.ticker.subscriptions.remove(self)
+
+class Ticker:
+	def __init__(self, clock=None) -> None:
+		self.clock = clock if clock is not None else SystemClock()
+		self.subscriptions: list[Subscription] = [] # a handful, a heap wouldn't pay off
+		self.condition = threading.Condition()
+		self.thread: threading.Thread = None
+		self.running = True
+
+	def subscribe(self, callback, interval: float, align: bool = False, paused: bool = False) -> Subscription:
+		# callback is called from the ticker thread
+		subscription = Subscription(self, callback, interval, align)
+		subscription.paused = paused
+		with self.condition:
+			subscription.schedule(self.clock.monotonic(), self.clock.time())
+			self.subscriptions.append(subscription)
+			if self.thread is None: # started by the first subscriber, so that nothing runs if nobody needs it
+				self.thread = threading.Thread(target=self.run, name="ticker", daemon=True)
+				self.thread.start()
+			self.condition.notify()
+		return subscription
+
+	def run(self) -> None:
+		while True:
+			with self.condition:
+				active = [subscription for subscription in self.subscriptions if not subscription.paused]
+				now = self.clock.monotonic()
+				nearest = min((subscription.deadline for subscription in active), default=None)
+				if not self.running:
+					return
+				if nearest is None or nearest > now:
+					self.condition.wait(None if nearest is None else nearest - now) # woken up early by a new or resumed subscriber
+					continue
+				due = [subscription for subscription in active if subscription.deadline <= now + SLACK]
+				wall = self.clock.time()
+				for subscription in due:
+					subscription.schedule(now, wall)
+			for subscription in due:
+				subscription.callback()
+
+	def close(self) -> None:
+		with self.condition:
+			self.running = False
+			self.condition.notify()
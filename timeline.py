@@ -0,0 +1,148 @@
+import datetime, hashlib, json, os, struct
+from array import array
+from bisect import bisect_left
+from bells import SoundType
+
+CACHE_FILE = "timeline.cache"
+CACHE_MAGIC = b"SBCT1"
+CACHE_HEADER = struct.Struct("<5s40siiI") # magic, config hash, first day, last day, number of bells
+
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+DAY_MINUTES = 24 * 60
+
+# all of the times in the timeline are "epoch minutes": minutes since 1970-01-01 00:00 local time,
+# so that a date and a time of day can be taken apart with a single divmod
+def epoch_day(date: datetime.date) -> int:
+	return date.toordinal() - EPOCH
+
+def to_date(day: int) -> datetime.date:
+	return datetime.date.fromordinal(EPOCH + day)
+
+def parse_date(text: str) -> datetime.date:
+	return datetime.date.fromisoformat(text)
+
+def school_year(today: datetime.date) -> tuple:
+	# from the 1st of September till the end of August
+	year = today.year if today.month >= 9 else today.year - 1
+	return datetime.date(year, 9, 1), datetime.date(year + 1, 8, 31)
+
+def day_bells(lessons_start, silent_minute, lesson_length, break_time, first_bell, num_lessons) -> list[tuple]:
+	# (minute of the day, sound) of a normal day, sorted
+	bells = [(silent_minute[0] * 60 + silent_minute[1], SoundType.SILENT_MINUTE.value)]
+	day_minute: int = lessons_start[0] * 60 + lessons_start[1] - first_bell
+	for lesson_number in range(num_lessons):
+		if day_minute >= 0: # so that the lessons can't possibly start yesterday
+			bells.append((day_minute, SoundType.FIRST_BELL.value))
+		day_minute += first_bell
+		bells.append((day_minute, SoundType.SECOND_BELL.value))
+		day_minute += lesson_length
+		bells.append((day_minute, SoundType.BREAK.value))
+		day_minute += break_time - first_bell
+
+	bells = [bell for bell in bells if bell[0] < DAY_MINUTES]
+	bells.sort(key=lambda bell: bell[0])
+	return bells
+
+def holiday_days(holidays) -> set[int]:
+	# every entry is either a single date or an inclusive [first, last] range
+	days = set()
+	for holiday in holidays:
+		if isinstance(holiday, str):
+			days.add(epoch_day(parse_date(holiday)))
+		else:
+			days.update(range(epoch_day(parse_date(holiday[0])), epoch_day(parse_date(holiday[1])) + 1))
+	return days
+
+class Timeline:
+	def __init__(self, first_day: int, last_day: int, minutes: array = None, sounds: array = None) -> None:
+		self.first_day = first_day
+		self.last_day = last_day
+		self.minutes: array = minutes if minutes is not None else array("q") # sorted epoch minutes
+		self.sounds: array = sounds if sounds is not None else array("b")   # SoundType values
+
+	def __len__(self) -> int:
+		return len(self.minutes)
+
+	def covers(self, date: datetime.date) -> bool:
+		return self.first_day <= epoch_day(date) <= self.last_day
+
+	def next_index(self, epoch_minute: int) -> int:
+		# index of the first bell at or after the given minute
+		return bisect_left(self.minutes, epoch_minute)
+
+	def day(self, date: datetime.date) -> range:
+		start = epoch_day(date) * DAY_MINUTES
+		return range(bisect_left(self.minutes, start), bisect_left(self.minutes, start + DAY_MINUTES))
+
+	def save(self, file_name: str, key: str) -> None:
+		temp_name = file_name + ".tmp"
+		with open(temp_name, "wb") as fp:
+			fp.write(CACHE_HEADER.pack(CACHE_MAGIC, key.encode(), self.first_day, self.last_day, len(self)))
+			fp.write(self.minutes.tobytes())
+			fp.write(self.sounds.tobytes())
+		os.replace(temp_name, file_name)
+
+	@classmethod
+	def load(cls, file_name: str, key: str):
+		# returns None if there is no usable cache for this config
+		try:
+			with open(file_name, "rb") as fp:
+				magic, file_key, first_day, last_day, count = CACHE_HEADER.unpack(fp.read(CACHE_HEADER.size))
+				if magic != CACHE_MAGIC or file_key != key.encode():
+					return None
+				timeline = cls(first_day, last_day)
+				timeline.minutes.fromfile(fp, count)
+				timeline.sounds.fromfile(fp, count)
+				return timeline
+		except (OSError, EOFError, struct.error):
+			return None
+
+def config_key(config: dict, first_day: datetime.date, last_day: datetime.date) -> str:
+	text = json.dumps([config, first_day.isoformat(), last_day.isoformat()], sort_keys=True)
+	return hashlib.sha1(text.encode()).hexdigest()
+
+def compile_timeline(config: dict, first_day: datetime.date, last_day: datetime.date) -> Timeline:
+	timeline = Timeline(epoch_day(first_day), epoch_day(last_day))
+	holidays = holiday_days(config["holidays"])
+	# every override is checked, not only the ones in this term, so that a broken one is noticed when the config is loaded
+	overrides = {epoch_day(parse_date(date)): [(hour * 60 + minute, SoundType(sound).value) for hour, minute, sound in bells] for date, bells in config["overrides"].items()}
+	short_days = {epoch_day(parse_date(date)): length for date, length in config["short_days"].items()}
+	templates = {} # lesson length -> bells of such a day, most of the days share the same one
+
+	for day in range(timeline.first_day, timeline.last_day + 1):
+		if day in overrides:
+			bells = sorted(overrides[day])
+			bells = [bell for bell in bells if bell[0] < DAY_MINUTES]
+		elif day in holidays or not config["workdays"][to_date(day).weekday()]:
+			continue
+		else:
+			lesson_length = short_days.get(day, config["lesson_length"])
+			if lesson_length not in templates:
+				templates[lesson_length] = day_bells(config["lessons_start"], config["silent_minute"], lesson_length, \
+					config["break_time"], config["first_bell"], config["num_lessons"])
+			bells = templates[lesson_length]
+		start = day * DAY_MINUTES
+		for minute, sound in bells:
+			timeline.minutes.append(start + minute)
+			timeline.sounds.append(sound)
+	return timeline
+
+def load_or_compile(config: dict, today: datetime.date, file_name: str = CACHE_FILE) -> Timeline:
+	if config["term"]:
+		first_day, last_day = parse_date(config["term"][0]), parse_date(config["term"][1])
+	else:
+		first_day, last_day = school_year(today)
+	if not first_day <= today <= last_day: # outside of the configured term, cover at least the current school year
+		first_day, last_day = school_year(today)
+
+	if file_name is None: # no cache at all
+		return compile_timeline(config, first_day, last_day)
+	key = config_key(config, first_day, last_day)
+	timeline = Timeline.load(file_name, key)
+	if timeline is None:
+		timeline = compile_timeline(config, first_day, last_day)
+		try:
+			timeline.save(file_name, key)
+		except OSError:
+			pass # the cache is just an optimization
+	return timeline
@@ -0,0 +1,177 @@
+import hashlib, mmap, os, queue, threading
+import numpy
+from numpy.lib import format as npy
+from stream import open_source, conform, Resampler
+
+# the sounds are prepared once, off the playback path: decoded, converted to the format of the output
+# device, trimmed and brought to the same loudness, then kept on disk as .npy files. playing one is
+# then just a memory mapped read, there is no decoder or resampler involved at the moment of the bell.
+
+CACHE_DIR = "sound_cache"
+DISK_BUDGET = 512 * 1024 * 1024 # bytes of .npy files, the least recently used ones go first
+TARGET_RMS = 10 ** (-20 / 20)   # loudness everything is brought to, as rms of the sounding part
+PEAK_LIMIT = 10 ** (-1 / 20)    # but the peaks never go above this
+SILENCE = 10 ** (-50 / 20)      # quieter than this at the start and at the end is trimmed
+PAD_SECONDS = 0.01              # left before and after the sound, so that it doesn't start with a click
+PROCESS_VERSION = 1             # bump when the processing changes, the old files are then never used again
+HASH_BLOCK = 1024 * 1024 # bytes
+COPY_FRAMES = 65536
+
+def content_hash(file_name: str) -> str:
+	digest = hashlib.sha1()
+	with open(file_name, "rb") as fp:
+		while block := fp.read(HASH_BLOCK):
+			digest.update(block)
+	return digest.hexdigest()
+
+def measure(block) -> tuple:
+	# (first sounding frame or None, last sounding frame + 1, energy, sounding frames, peak) of a block
+	level = numpy.abs(block).max(axis=1)
+	loud = numpy.flatnonzero(level > SILENCE)
+	if not len(loud):
+		return None, 0, 0.0, 0, 0.0
+	return int(loud[0]), int(loud[-1]) + 1, float(numpy.square(block[loud], dtype=numpy.float64).sum()), len(loud), float(level[loud].max())
+
+def trim_and_gain(first: int, last: int, frames: int, energy: float, sounding: int, peak: float, channels: int, samplerate: int) -> tuple:
+	# (first frame, last frame + 1, gain) of what is kept of the whole sound
+	if first is None: # silence all the way, nothing to normalize
+		first, last, gain = 0, frames, 1.0
+	else:
+		rms = (energy / (sounding * channels)) ** 0.5
+		gain = min(TARGET_RMS / rms, PEAK_LIMIT / peak)
+	pad = round(PAD_SECONDS * samplerate)
+	return max(0, first - pad), min(frames, last + pad), gain
+
+def normalize(data, samplerate: int):
+	# the same as process, for a sound that is already in memory
+	first, last, energy, sounding, peak = measure(data)
+	first, last, gain = trim_and_gain(first, last, len(data), energy, sounding, peak, data.shape[1], samplerate)
+	return data[first:last] * numpy.float32(gain)
+
+def process(file_name: str, samplerate: int, channels: int, target: str) -> None:
+	# two passes, so that even an hour long file is never in memory as a whole:
+	# decode into a raw temp file while measuring, then copy the sounding part with the gain applied
+	file_rate, _, blocks = open_source(file_name)
+	resampler = Resampler(file_rate, samplerate)
+	raw_name = target + ".raw"
+	frames = 0
+	first, last = None, 0 # sounding frames
+	energy, sounding, peak = 0.0, 0, 0.0
+	with open(raw_name, "wb") as fp:
+		for block in blocks:
+			block = numpy.ascontiguousarray(resampler.process(conform(block, channels)), dtype=numpy.float32)
+			block_first, block_last, block_energy, block_sounding, block_peak = measure(block)
+			if block_first is not None:
+				if first is None:
+					first = frames + block_first
+				last = frames + block_last
+				energy += block_energy
+				sounding += block_sounding
+				peak = max(peak, block_peak)
+			fp.write(block.tobytes())
+			frames += len(block)
+
+	try:
+		first, last, gain = trim_and_gain(first, last, frames, energy, sounding, peak, channels, samplerate)
+		source = numpy.memmap(raw_name, dtype=numpy.float32, mode="r", shape=(frames, channels)) if frames else numpy.zeros((0, channels), numpy.float32)
+		temp_name = target + ".tmp"
+		out = npy.open_memmap(temp_name, mode="w+", dtype=numpy.float32, shape=(last - first, channels))
+		for i in range(first, last, COPY_FRAMES):
+			end = min(last, i + COPY_FRAMES)
+			out[i - first:end - first] = source[i:end] * numpy.float32(gain)
+		out.flush()
+		del out, source
+		os.replace(temp_name, target)
+	finally:
+		os.remove(raw_name)
+
+class DiskCache:
+	def __init__(self, directory: str = CACHE_DIR, budget: int = DISK_BUDGET) -> None:
+		self.directory = directory
+		self.budget = budget
+		self.hashes: dict[str, tuple] = {}  # file name -> (mtime, size, content hash), so that a file is read only when it changes
+		self.ready: dict[tuple, str] = {}   # (file name, samplerate, channels) -> .npy file
+		self.opened: dict[str, object] = {} # .npy file -> its memmap, kept open
+		self.lock = threading.Lock()
+		self.requests: queue.Queue = queue.Queue()
+		self.thread = threading.Thread(target=self.worker, name="transcoder", daemon=True)
+		self.thread.start()
+
+	def request(self, file_name: str, samplerate: int, channels: int) -> None:
+		# prepares it in the background, get() returns it once it's done
+		self.requests.put((file_name, samplerate, channels))
+
+	def get(self, file_name: str, samplerate: int, channels: int):
+		# a read only memmap of the prepared sound, None if it isn't ready (or the file changed since)
+		stat = os.stat(file_name)
+		key = (file_name, samplerate, channels)
+		with self.lock:
+			known = self.hashes.get(file_name)
+			target = self.ready.get(key)
+		if target is None or known is None or known[:2] != (stat.st_mtime_ns, stat.st_size):
+			return None
+		data = self.opened.get(target)
+		if data is None:
+			try:
+				data = numpy.load(target, mmap_mode="r")
+			except (OSError, ValueError): # evicted or broken
+				return None
+			if hasattr(data, "_mmap") and hasattr(mmap, "MADV_WILLNEED"):
+				data._mmap.madvise(mmap.MADV_WILLNEED) # start paging it in now, not in the audio callback
+			with self.lock:
+				if self.ready.get(key) == target: # not replaced or evicted in the meantime
+					self.opened[target] = data
+		return data
+
+	def worker(self) -> None:
+		while True:
+			file_name, samplerate, channels = self.requests.get()
+			try:
+				self.prepare(file_name, samplerate, channels)
+			except (RuntimeError, OSError, ValueError):
+				pass # played the slow way then, nothing else to do here
+
+	def prepare(self, file_name: str, samplerate: int, channels: int) -> None:
+		stat = os.stat(file_name)
+		with self.lock:
+			known = self.hashes.get(file_name)
+		if known is None or known[:2] != (stat.st_mtime_ns, stat.st_size):
+			known = (stat.st_mtime_ns, stat.st_size, content_hash(file_name))
+		# the same content under any name or path is prepared only once
+		target = os.path.join(self.directory, f"{known[2]}-{samplerate}-{channels}-{PROCESS_VERSION}.npy")
+		if os.path.exists(target):
+			os.utime(target) # recently used
+		else:
+			os.makedirs(self.directory, exist_ok=True)
+			process(file_name, samplerate, channels, target)
+			self.evict()
+		with self.lock:
+			self.hashes[file_name] = known
+			self.ready[(file_name, samplerate, channels)] = target
+			self.close_unused()
+
+	def evict(self) -> None:
+		files = []
+		for entry in os.scandir(self.directory):
+			if entry.name.endswith(".npy"):
+				stat = entry.stat()
+				files.append((stat.st_mtime, stat.st_size, entry.path))
+		size = sum(file_size for _, file_size, _ in files)
+		for _, file_size, path in sorted(files):
+			if size <= self.budget:
+				break
+			try:
+				os.remove(path) # an open memmap of it stays valid
+			except OSError:
+				continue # in use on windows
+			size -= file_size
+			with self.lock:
+				self.ready = {key: target for key, target in self.ready.items() if target != path}
+				self.close_unused()
+
+	def close_unused(self) -> None:
+		# with the lock held: the memmaps nothing is ready with any more are let go
+		# (a voice that still plays one keeps its own reference)
+		used = set(self.ready.values())
+		for target in [target for target in self.opened if target not in used]:
+			del self.opened[target]
@@ -1,11 +1,14 @@
 from PySide6 import QtWidgets, QtGui, QtCore
-import time
+import time, os, difflib
+from events import Event, Settings
+from bells import SoundType, BELL_NAMES
+from journal import LATE_MARK
 
 VERSION = "0.1.0"
 DAYS_OF_WEEK = "Понеділок Вівторок Середа Четвер П'ятниця Субота Неділя".split()
 
 class Ui:
-	def __init__(self, menu_callback, periodic_task):
+	def __init__(self, menu_callback, bus, ticker):
 		self.app = QtWidgets.QApplication([])
 		self.app.setQuitOnLastWindowClosed(False)
 		self.window = MainWindow()
@@ -14,27 +17,45 @@ class Ui:
 		self.toolbar = ToolBar(self.window, self.menu_actions)
 		self.tray = Tray(self.window)
 
-		# timer for starting bells
-		self.timer = QtCore.QTimer()
-		self.timer.timeout.connect(periodic_task)
-		self.timer.start(1000)
+		# the scheduler and the player publish from their own threads, the signal brings it to the gui thread
+		self.bus = bus
+		self.bus_signals = BusSignals()
+		self.bus_signals.pending.connect(self.handle_events)
+		self.bus.notify = self.bus_signals.pending.emit
+
+		# the clock in the window ticks on whole seconds with the scheduler's ticker, and not at all
+		# while nobody can see it (hidden to the tray or minimized)
+		self.bus_signals.clock.connect(self.window.status_box.update)
+		self.clock = ticker.subscribe(self.bus_signals.clock.emit, 1, align=True, paused=True)
+		self.window.visibility_changed.connect(self.set_visible)
 
 	def run(self):
 		self.window.show()
 		self.tray.setVisible(True)
 		self.app.exec()
 
-	def get_settings(self):
-		return self.window.get_settings()
-
-	def set_settings(self, *args):
-		self.window.set_settings(*args)
-
-	def set_schedule(self, bells):
-		self.window.set_schedule(bells)
-
-	def select_bell(self, bell_n):
-		self.window.select_bell(bell_n)
+	def handle_events(self):
+		for event, data in self.bus.drain():
+			match event:
+				case Event.SETTINGS:       self.window.set_settings(*data)
+				case Event.SCHEDULE:       self.window.set_schedule(*data)
+				case Event.BELL:           self.window.select_bell(*data)
+				case Event.ENABLED:        self.menu_actions.set_running(data)
+				case Event.SOUND_STARTED:  self.window.status_box.set_now_playing(data)
+				case Event.SOUND_FINISHED: self.window.status_box.clear_now_playing(data)
+				case Event.METRICS:        self.window.status_box.set_metrics(data)
+				case Event.APPLIED:        self.menu_actions.show_result(0, data)
+				case Event.SAVED:          self.menu_actions.show_result(1, data)
+
+	def set_visible(self, visible):
+		if visible:
+			self.clock.resume()
+		else:
+			self.clock.pause()
+
+class BusSignals(QtCore.QObject):
+	pending = QtCore.Signal()
+	clock = QtCore.Signal()
 
 class Tray(QtWidgets.QSystemTrayIcon):
 	def __init__(self, window):
@@ -79,21 +100,28 @@ class MenuActions:
 	def handle_button(self, button):
 		match button:
 			case 0 | 1 | 2 | 3:
-				self.callback(button)
-				match button:
-					case 0: QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Налаштування застосовано!")
-					case 1: QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Налаштування збережено!")
-					case 2:
-						self.button_start.setEnabled(False)
-						self.button_stop .setEnabled(True) 
-						QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Дзвінки запущено. Якщо ви налаштували щось не так, самі винні!")
-					case 3:
-						self.button_start.setEnabled(True)
-						self.button_stop .setEnabled(False)
-						QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Дзвінки зупинено. Щось пішло не так, еге ж? Піди і виправи це негайно!")
+				self.callback(button, self.window.get_settings())
+				match button: # apply and save report back once the scheduler has done them, see show_result
+					case 2: QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Дзвінки запущено. Якщо ви налаштували щось не так, самі винні!")
+					case 3: QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Дзвінки зупинено. Щось пішло не так, еге ж? Піди і виправи це негайно!")
 			case 4: QtWidgets.QMessageBox.information(self.window, "SBC - Про програму", \
 				f"SBC v.{VERSION}\nАвтор: 2o\nTelegram: @xfdtw\nDiscord: @2o___\nЯкщо щось не зрозуміло/не працює пишіть туди.")
 
+	def show_result(self, button, error):
+		if error is not None:
+			match button:
+				case 0: QtWidgets.QMessageBox.warning(self.window, "SBC - Помилка", f"Не вдалося застосувати налаштування:\n{error}")
+				case 1: QtWidgets.QMessageBox.warning(self.window, "SBC - Помилка", f"Не вдалося зберегти налаштування:\n{error}")
+			return
+		match button:
+			case 0: QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Налаштування застосовано!")
+			case 1: QtWidgets.QMessageBox.information(self.window, "SBC - Інформація", "Налаштування збережено!")
+
+	def set_running(self, running):
+		# the buttons follow the state the scheduler reports
+		self.button_start.setEnabled(not running)
+		self.button_stop .setEnabled(running)
+
 class ToolBar(QtWidgets.QToolBar):
 	def __init__(self, window, menu_actions):
 		super().__init__("Toolbar")
@@ -121,6 +149,8 @@ class MenuBar(QtWidgets.QMenuBar):
 		self.help_menu.addAction(menu_actions.button_about)
 
 class MainWindow(QtWidgets.QMainWindow):
+	visibility_changed = QtCore.Signal(bool)
+
 	def __init__(self):
 		super().__init__()
 		self.setWindowTitle("SBC - Головне вікно")
@@ -141,6 +171,26 @@ class MainWindow(QtWidgets.QMainWindow):
 		self.main_layout.addWidget(self.status_box,      0, 2, 1, 1)
 		self.main_layout.addWidget(self.sound_files_box, 1, 2, 1, 1)
 		self.setCentralWidget(self.main_widget)
+		self.visible = False
+
+	def showEvent(self, event):
+		super().showEvent(event)
+		self.check_visible()
+
+	def hideEvent(self, event):
+		super().hideEvent(event)
+		self.check_visible()
+
+	def changeEvent(self, event):
+		super().changeEvent(event)
+		if event.type() == QtCore.QEvent.Type.WindowStateChange:
+			self.check_visible()
+
+	def check_visible(self):
+		visible = self.isVisible() and not self.isMinimized()
+		if visible != self.visible:
+			self.visible = visible
+			self.visibility_changed.emit(visible)
 
 	def get_settings(self):
 		first_lesson_input  = self.schedule_box.first_lesson_input .time()
@@ -152,7 +202,7 @@ class MainWindow(QtWidgets.QMainWindow):
 		break_length  = self.schedule_box.break_length_input .value()
 		first_bell    = self.schedule_box.first_bell_input   .value()
 		num_lessons   = self.schedule_box.num_lessons_input  .value()
-		workdays = [checkbox.isChecked() for checkbox in self.days_select_box.days_checkboxes]
+		workdays = tuple(checkbox.isChecked() for checkbox in self.days_select_box.days_checkboxes)
 		sound_files = (
 			self.sound_files_box.first_bell_file_text   .text(),
 			self.sound_files_box.second_bell_file_text  .text(),
@@ -160,7 +210,7 @@ class MainWindow(QtWidgets.QMainWindow):
 			self.sound_files_box.silent_minute_file_text.text()
 		)
 
-		return (first_lesson, silent_minute, lesson_length, break_length, first_bell, num_lessons, workdays, sound_files)
+		return Settings(first_lesson, silent_minute, lesson_length, break_length, first_bell, num_lessons, workdays, sound_files)
 
 	def set_settings(self, *args):
 		self.schedule_box.first_lesson_input .setTime (QtCore.QTime(*args[0]))
@@ -175,13 +225,13 @@ class MainWindow(QtWidgets.QMainWindow):
 		self.sound_files_box.break_file_text        .setText(args[7][2])
 		self.sound_files_box.silent_minute_file_text.setText(args[7][3])
 
-	def set_schedule(self, bells):
-		self.bell_status_box.bells_list.clear()
-		for bell in bells:
-			self.bell_status_box.bells_list.addItem(bell)
+	def set_schedule(self, day, table, played, next_bell):
+		self.bell_status_box.model.set_schedule(day, table, played, next_bell)
 
-	def select_bell(self, bell_n):
-		self.bell_status_box.bells_list.setCurrentItem(self.bell_status_box.bells_list.item(bell_n))
+	def select_bell(self, bell_n, lateness):
+		model = self.bell_status_box.model
+		model.bell_fired(bell_n, lateness)
+		self.bell_status_box.bells_list.setCurrentIndex(model.index(bell_n))
 
 class BasicBox(QtWidgets.QScrollArea):
 	def __init__(self, title):
@@ -199,9 +249,106 @@ class BasicBox(QtWidgets.QScrollArea):
 class BellStatusBox(BasicBox):
 	def __init__(self):
 		super().__init__("Розклад дзвінків")
-		self.bells_list = QtWidgets.QListWidget()
+		self.model = BellListModel()
+		self.bells_list = QtWidgets.QListView()
+		self.bells_list.setModel(self.model)
+		self.bells_list.setUniformItemSizes(True) # no need to measure every row
 		self.layout.addWidget(self.bells_list)
 
+class BellListModel(QtCore.QAbstractListModel):
+	# today's bells of the main zone, the rows are formatted only when the view asks for them
+	def __init__(self):
+		super().__init__()
+		self.day = None
+		self.rows = []     # (minute of the day, SoundType value), taken from the scheduler's bell table
+		self.played = []   # per row
+		self.lateness = [] # per row, seconds of the bells that were late, None for the rest
+		self.next_bell = 0
+		self.bold = QtGui.QFont()
+		self.bold.setBold(True)
+
+	def rowCount(self, parent=QtCore.QModelIndex()):
+		return 0 if parent.isValid() else len(self.rows)
+
+	def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+		row = index.row()
+		if not index.isValid() or row >= len(self.rows):
+			return None
+		match role:
+			case QtCore.Qt.ItemDataRole.DisplayRole:
+				day_minute, sound = self.rows[row]
+				text = f"{day_minute // 60:02}:{day_minute % 60:02} - {BELL_NAMES[SoundType(sound)]}"
+				if self.lateness[row] is not None:
+					text += f" (запізнення {self.lateness[row]:.1f} с)"
+				return text
+			case QtCore.Qt.ItemDataRole.ForegroundRole:
+				if self.lateness[row] is not None:
+					return QtGui.QColor("red")
+				if self.played[row]:
+					return QtGui.QColor("gray")
+			case QtCore.Qt.ItemDataRole.FontRole:
+				if row == self.next_bell:
+					return self.bold
+		return None
+
+	def set_schedule(self, day, table, played, next_bell):
+		new_rows = list(zip(table.minutes, table.sounds))
+		if day != self.day: # a new day, nothing to keep
+			self.beginResetModel()
+			self.day = day
+			self.rows = new_rows
+			self.played = [bool(flag) for flag in played]
+			self.lateness = [None] * len(new_rows)
+			self.next_bell = next_bell
+			self.endResetModel()
+			return
+
+		# only the rows that differ are removed and inserted, so the view keeps its scroll position and selection
+		opcodes = difflib.SequenceMatcher(None, self.rows, new_rows, autojunk=False).get_opcodes()
+		# every per row list moves together with the rows, so the view never sees the state of another bell
+		for tag, i1, i2, j1, j2 in reversed(opcodes): # from the end, so the earlier positions stay valid
+			if tag in ("delete", "replace"):
+				self.beginRemoveRows(QtCore.QModelIndex(), i1, i2 - 1)
+				del self.rows[i1:i2]
+				del self.played[i1:i2]
+				del self.lateness[i1:i2]
+				if self.next_bell >= i1:
+					self.next_bell = max(i1, self.next_bell - (i2 - i1))
+				self.endRemoveRows()
+			if tag in ("insert", "replace"):
+				self.beginInsertRows(QtCore.QModelIndex(), i1, i1 + j2 - j1 - 1)
+				self.rows[i1:i1] = new_rows[j1:j2]
+				self.played[i1:i1] = [False] * (j2 - j1)
+				self.lateness[i1:i1] = [None] * (j2 - j1)
+				if self.next_bell >= i1:
+					self.next_bell += j2 - j1
+				self.endInsertRows()
+
+		# the bells that stayed keep their state, the scheduler's flags only add to it
+		played = [bool(flag) or self.played[n] for n, flag in enumerate(played)]
+		changed = {n for n in range(len(new_rows)) if played[n] != self.played[n]}
+		changed |= {self.next_bell, next_bell}
+		self.played = played
+		self.next_bell = next_bell
+		for row in sorted(changed):
+			if row < len(new_rows):
+				self.row_changed(row)
+
+	def bell_fired(self, bell_n, lateness):
+		if bell_n >= len(self.rows):
+			return
+		self.played[bell_n] = True
+		if lateness > LATE_MARK:
+			self.lateness[bell_n] = lateness
+		previous, self.next_bell = self.next_bell, bell_n + 1
+		for row in {previous, bell_n, self.next_bell}:
+			if row < len(self.rows):
+				self.row_changed(row)
+
+	def row_changed(self, row):
+		index = self.index(row)
+		self.dataChanged.emit(index, index)
+
 class ScheduleBox(BasicBox):
 	def __init__(self):
 		super().__init__("Налаштування розкладу")
@@ -264,21 +411,24 @@ class StatusBox(BasicBox):
 		self.day_of_week_widget = QtWidgets.QLabel()
 		self.current_time_widget = QtWidgets.QLabel()
 		self.uptime_widget = QtWidgets.QLabel()
+		self.now_playing_widget = QtWidgets.QLabel()
+		self.lateness_widget = QtWidgets.QLabel("-")
 		self.grid_layout.addWidget(QtWidgets.QLabel("День тижня:"),    0, 0)
 		self.grid_layout.addWidget(self.day_of_week_widget,            0, 1)
 		self.grid_layout.addWidget(QtWidgets.QLabel("Поточний час:"),  1, 0)
 		self.grid_layout.addWidget(self.current_time_widget,           1, 1)
 		self.grid_layout.addWidget(QtWidgets.QLabel("Зі запуску:"),    2, 0)
 		self.grid_layout.addWidget(self.uptime_widget,                 2, 1)
+		self.grid_layout.addWidget(QtWidgets.QLabel("Зараз грає:"),    3, 0)
+		self.grid_layout.addWidget(self.now_playing_widget,            3, 1)
+		self.grid_layout.addWidget(QtWidgets.QLabel("Запізнення:"),    4, 0)
+		self.grid_layout.addWidget(self.lateness_widget,               4, 1)
 
 		self.layout.addWidget(self.grid_widget)
 		self.layout.addStretch(1)
 
 		self.uptime_timer = QtCore.QElapsedTimer()
-		self.timer = QtCore.QTimer()
-		self.timer.timeout.connect(self.update)
 		self.uptime_timer.start()
-		self.timer.start(1000)
 		self.update()
 
 	def update(self):
@@ -291,6 +441,16 @@ class StatusBox(BasicBox):
 		days = hours / 24
 		self.uptime_widget.setText(f"{int(days)} днів, {int(hours % 24):02}:{int(minutes % 60):02}:{int(seconds % 60):02}")
 
+	def set_now_playing(self, file_name):
+		self.now_playing_widget.setText(os.path.basename(file_name))
+
+	def clear_now_playing(self, file_name):
+		if self.now_playing_widget.text() == os.path.basename(file_name): # something else may have started meanwhile
+			self.now_playing_widget.setText("")
+
+	def set_metrics(self, summary):
+		self.lateness_widget.setText(summary)
+
 class SoundFilesBox(BasicBox):
 	def __init__(self):
 		super().__init__("Звуки")
@@ -0,0 +1,29 @@
+import os
+
+WATCH_INTERVAL = 2 # seconds between the checks of the file
+
+def file_stat(file_name: str) -> tuple:
+	# what changes when the file is written or replaced, None if there is no such file
+	try:
+		stat = os.stat(file_name)
+	except OSError:
+		return None
+	return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+class FileWatcher:
+	# calls on_change from the ticker thread whenever the file is written, replaced, created or deleted.
+	# polling a single stat is portable and cheap enough, no need for inotify and the like
+	def __init__(self, file_name: str, on_change, ticker, interval: float = WATCH_INTERVAL) -> None:
+		self.file_name = file_name
+		self.on_change = on_change
+		self.stat = file_stat(file_name)
+		self.subscription = ticker.subscribe(self.check, interval)
+
+	def check(self) -> None:
+		stat = file_stat(self.file_name)
+		if stat != self.stat:
+			self.stat = stat
+			self.on_change()
+
+	def close(self) -> None:
+		self.subscription.cancel()
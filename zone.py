@@ -0,0 +1,50 @@
+import time, zlib
+from array import array
+from bells import SoundType
+from bell_table import BellTable, PlayedSet
+import timeline
+
+MAIN_ZONE = "Основна" # the zone edited in the window, made of the top level fields of the config
+
+def zone_key(name: str) -> int:
+	# what the journal knows a zone by: its name, not its place in the config, which changes when zones are
+	# added, removed or moved. 16 bits, so two names may clash, the odds are tiny for the few zones of a school
+	return zlib.crc32(name.encode()) & 0xFFFF
+
+class Zone:
+	def __init__(self, zone_id: int, name: str, schedule: dict, sound_files: tuple, output) -> None:
+		self.zone_id = zone_id
+		self.name = name
+		self.key = zone_key(name)
+		self.schedule = schedule       # everything its timeline depends on, see Scheduler.schedule_config
+		self.sound_files = sound_files
+		self.output = output           # sounddevice output device, None for the default one
+		self.timeline: timeline.Timeline = None # zones with the same schedule share one
+		self.table = BellTable(array("H"), array("b"), array("d")) # today's bells
+		self.played = PlayedSet()  # the played flags are per zone, the table is shared
+		self.next_bell: int = 0
+
+	def build(self, today, t: time.struct_time, days: dict) -> None:
+		# today's bells from the compiled timeline, days keeps the tables the zones with the same timeline can share
+		if id(self.timeline) not in days:
+			days[id(self.timeline)] = BellTable.for_day(self.timeline, today, t)
+		self.table = days[id(self.timeline)]
+		self.played.reset(len(self.table))
+
+	def carry_played(self, old) -> None:
+		# the same zone rebuilt during the day: a bell at the same minute with the same sound has already rung
+		played = {(old.table.minutes[bell_n], old.table.sounds[bell_n]) for bell_n in range(len(old.table)) if bell_n in old.played}
+		for bell_n in range(len(self.table)):
+			if (self.table.minutes[bell_n], self.table.sounds[bell_n]) in played:
+				self.played.add(bell_n)
+
+	def seek(self, now: float, late_limit: float) -> None:
+		# skip the bells that are too late to be played
+		self.next_bell = self.table.index(now - late_limit)
+
+	def sound_file(self, sound: SoundType) -> str:
+		match sound:
+			case SoundType.FIRST_BELL:    return self.sound_files[0]
+			case SoundType.SECOND_BELL:   return self.sound_files[1]
+			case SoundType.BREAK:         return self.sound_files[2]
+			case SoundType.SILENT_MINUTE: return self.sound_files[3]